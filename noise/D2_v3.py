@@ -3,7 +3,9 @@
 # Isaac H. Kim 2020/12/24         #
 ###################################
 import numpy as np
-from compressor import pcc, qubits, circ_subtract, rearrange, compress, optimal_width_freeze, depth_width_reduced_freeze
+from functools import lru_cache
+from compressor import Circuit, pcc, qubits, circ_subtract, rearrange, compress
+from circuit_cache import cached_compress_freeze_stats
 
 
 def sites_2d(n, s):
@@ -138,6 +140,21 @@ def dmera_2d(n, D):
     return dmera_out
 
 
+@lru_cache(maxsize=None)
+def dmera_2d_circuit(n, D):
+    """
+    dmera_2d(n, D) as a read-only Circuit. Built once per (n, D) and
+    shared by pcc_dmera_2d and everything built on it.
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+
+    Returns:
+        Circuit: Array-backed DMERA circuit
+    """
+    return Circuit.from_list(dmera_2d(n, D))
+
+
 def pcc_dmera_2d(n, D, supp):
     """
     Args:
@@ -148,7 +165,37 @@ def pcc_dmera_2d(n, D, supp):
     Returns:
         list(list(tuple)): Past causal cone of supp
     """
-    return pcc(dmera_2d(n,D),supp)
+    return pcc(dmera_2d_circuit(n,D), supp).to_list()
+
+
+# Memoized compression results, keyed by (n, D, support)
+_pcc_stats = {}
+
+
+def stats_pcc_dmera_2d(n, D, supp, keep_circuit=False):
+    """
+    Width, depth, volume and number of resets of the width-reduced past
+    causal cone, from a single compression. Results are memoized, and also
+    cached on disk if $ER_NOISE_CIRCUIT_CACHE is set (see circuit_cache).
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        supp(list): List of 2D coordinates
+        keep_circuit(bool): Also return the compressed circuit under
+                            'circuit'
+
+    Returns:
+        dict: See compressor.compressed_stats
+    """
+    key_supp = tuple(sorted(tuple(c) for c in supp))
+    key = (n, D, key_supp)
+    if not key in _pcc_stats or (keep_circuit and not 'circuit' in _pcc_stats[key]):
+        supp_con = [convert_2d_to_1d(c,n) for c in key_supp]
+        _pcc_stats[key] = cached_compress_freeze_stats(pcc_dmera_2d(n,D,supp_con), supp_con, keep_circuit)
+    stats = dict(_pcc_stats[key])
+    if not keep_circuit:
+        stats.pop('circuit', None)
+    return stats
 
 
 def width_pcc_dmera_2d(n, D, supp):
@@ -157,13 +204,12 @@ def width_pcc_dmera_2d(n, D, supp):
     Args:
         n(int): Number of scales
         D(int): Number of cycles per scale
-        supp(list): List of integers    
+        supp(list): List of 2D coordinates
 
     Returns:
         int: Optimal width
     """
-    supp_con = [convert_2d_to_1d(c,n) for c in supp]
-    return optimal_width_freeze(pcc_dmera_2d(n,D,supp_con),supp_con)
+    return stats_pcc_dmera_2d(n, D, supp)['width']
 
 
 def depth_pcc_dmera_2d(n, D, supp):
@@ -172,10 +218,9 @@ def depth_pcc_dmera_2d(n, D, supp):
     Args:
         n(int): Number of scales
         D(int): Number of cycles per scale
-        supp(list): List of integers    
+        supp(list): List of 2D coordinates
 
     Returns:
         int: Optimal width
     """
-    supp_con = [convert_2d_to_1d(c,n) for c in supp]
-    return depth_width_reduced_freeze(pcc_dmera_2d(n,D,supp_con),supp_con)
+    return stats_pcc_dmera_2d(n, D, supp)['depth']
@@ -0,0 +1,191 @@
+###################################
+# Benchmarks                      #
+###################################
+# Run from this directory, e.g.
+#
+#   python bench.py                       # time everything
+#   python bench.py -k pcc -k compress    # only names containing pcc or compress
+#   python bench.py --save                # record the timings as the baseline
+#   python bench.py --compare             # exit with status 1 on a regression
+#                                         # or a benchmark without baseline
+#
+# Each benchmark reports the best time per call over --repeat runs; the
+# number of calls per run is chosen by timeit so that a run takes at least
+# 0.2s. Baselines are machine-specific: record one with --save on the
+# machine that will run --compare.
+from compressor import pcc, ancestor_width, rearrange_freeze, compress_freeze
+from D1_v2 import dmera_1d_circuit
+from D2_v2 import dmera_2d_circuit, convert_2d_to_1d
+from sim import twoQ, depolarizing
+import numpy as np
+import argparse
+import platform
+import timeit
+import json
+import sys
+import os
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+
+# (n, D) grids of the circuit benchmarks
+GRID_1D = [(n, D) for n in (6, 8, 10) for D in (2, 4)]
+GRID_2D = [(n, D) for n in (2, 3, 4) for D in (2, 4)]
+# Numbers of qubits of the simulation benchmarks. A 14-qubit density matrix
+# takes 4GB, so it is only timed with --large.
+SIM_QUBITS = (6, 8, 10, 12)
+SIM_QUBITS_LARGE = (14,)
+
+
+def _circuit_cases():
+    # Nearest-neighbor support in the middle of the lattice
+    for n, D in GRID_1D:
+        x = 2**(n-1)
+        yield '1d n={} D={}'.format(n, D), dmera_1d_circuit(n, D), [x, x+1]
+    for n, D in GRID_2D:
+        x = 2**(n-1)
+        yield '2d n={} D={}'.format(n, D), dmera_2d_circuit(n, D), \
+            [convert_2d_to_1d((x, x), n), convert_2d_to_1d((x+1, x), n)]
+
+
+def benchmarks(large=False):
+    """
+    Args:
+        large(bool): Include the 14-qubit simulation benchmarks
+
+    Returns:
+        list(tuple): (name, callable) pairs. Setup (building the circuits
+                     and density matrices) is done here, not in the timed
+                     callables.
+    """
+    cases = []
+    for label, circ, supp in _circuit_cases():
+        # The drivers compress list cones (pcc_dmera_*), not Circuits
+        cone = pcc(circ, supp).to_list()
+        cases.append(('pcc[{}]'.format(label), lambda c=circ, s=supp: pcc(c, s)))
+        cases.append(('width[{}]'.format(label), lambda c=circ, s=supp: ancestor_width(c, s)))
+        cases.append(('rearrange[{}]'.format(label), lambda c=cone, s=supp: rearrange_freeze(c, s)))
+        cases.append(('compress[{}]'.format(label), lambda c=cone, s=supp: compress_freeze(c, s)))
+
+    rng = np.random.default_rng(0)
+    U = np.linalg.qr(rng.normal(size=(4, 4)) + 1j*rng.normal(size=(4, 4)))[0]
+    for n_q in SIM_QUBITS + (SIM_QUBITS_LARGE if large else ()):
+        # Timings do not depend on the entries, only on the shape
+        rho = np.full((2**n_q, 2**n_q), 1/2**n_q, dtype=complex)
+        q = n_q//2
+        cases.append(('twoQ[{}q]'.format(n_q), lambda r=rho, q=q: twoQ(U, r, q-1, q)))
+        cases.append(('depolarizing[{}q]'.format(n_q), lambda r=rho, q=q: depolarizing(r, q, 0.01)))
+    return cases
+
+
+def time_call(func, repeat=5):
+    """
+    Returns:
+        float: Best time per call of func(), in seconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def machine():
+    return {'node': platform.node(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'python': platform.python_version(),
+            'numpy': np.__version__}
+
+
+def load_baseline(path=BASELINE):
+    """
+    Returns:
+        dict: {'machine': machine(), 'results': {name: seconds}}, empty if
+              path does not exist
+    """
+    if not os.path.exists(path):
+        return {'machine': None, 'results': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE):
+    """
+    Record results in the baseline file. Benchmarks that were not run keep
+    their previous baseline.
+    """
+    baseline = load_baseline(path)
+    baseline['machine'] = machine()
+    baseline['results'].update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Args:
+        results(dict): {name: seconds}
+        baseline(dict): {name: seconds}
+        threshold(float): Allowed relative slowdown
+
+    Returns:
+        list(str): Names of the benchmarks slower than
+                   (1+threshold) * baseline
+    """
+    return [name for name, t in results.items()
+            if name in baseline and t > (1+threshold) * baseline[name]]
+
+
+def run(patterns=(), repeat=5, large=False, baseline=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Time the benchmarks whose names contain one of patterns (all if empty)
+    and print one line per benchmark.
+
+    Returns:
+        dict: {name: seconds}
+    """
+    results = {}
+    for name, func in benchmarks(large):
+        if patterns and not any(p in name for p in patterns):
+            continue
+        t = results[name] = time_call(func, repeat)
+        line = "{:32s} {:12.3e} s".format(name, t)
+        if baseline is not None and name in baseline:
+            ratio = t / baseline[name]
+            line += "   x{:.2f}{}".format(ratio, "  REGRESSION" if ratio > 1+threshold else "")
+        print(line, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the compressor and the simulator.")
+    parser.add_argument('-k', dest='patterns', action='append', default=[],
+                        help="Only run benchmarks whose name contains this string (repeatable)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument('--large', action='store_true', help="Include the 14-qubit simulation benchmarks")
+    parser.add_argument('--baseline', default=BASELINE, help="Baseline file")
+    parser.add_argument('--save', action='store_true', help="Record the timings in the baseline file")
+    parser.add_argument('--compare', action='store_true',
+                        help="Exit with status 1 on a regression or a benchmark without baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown before a benchmark counts as a regression")
+    args = parser.parse_args(argv)
+
+    stored = load_baseline(args.baseline)
+    if args.compare and stored['machine'] is not None and stored['machine'] != machine():
+        print("warning: baseline recorded on {}".format(stored['machine']))
+    results = run(args.patterns, args.repeat, args.large, stored['results'], args.threshold)
+    if args.save:
+        save_baseline(results, args.baseline)
+    if args.compare:
+        slower = compare(results, stored['results'], args.threshold)
+        missing = [name for name in results if name not in stored['results']]
+        if missing:
+            print("no baseline for {} benchmark(s) in {}; record one with --save".format(len(missing), args.baseline))
+        if slower:
+            print("{} regression(s): {}".format(len(slower), ", ".join(slower)))
+        if missing or slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+###################################
+# BLAS threads of worker processes#
+###################################
+# BLAS and OpenMP size their thread pools from the *_NUM_THREADS variables
+# when they are loaded, i.e. when numpy is first imported. Scripts that run
+# one worker process per core should therefore call limit_blas_env before
+# importing numpy (directly or through sim, compressor, ...), e.g.
+#
+#   from blas_threads import limit_blas_env
+#   workers = None
+#   limit_blas_env(workers=workers)
+#   from noise_study_1D import noise_estimate_pcc
+#
+# Forked workers inherit the limited pools. A single process keeps its full
+# pools. This module must not import numpy itself.
+import warnings
+import sys
+import os
+
+
+BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def limit_blas_env(threads=1, workers=None):
+    """
+    Set the *_NUM_THREADS variables that are not already set, if several
+    worker processes will be used. Warns if numpy is already loaded, in
+    which case they no longer take effect.
+
+    Args:
+        threads(int): Threads per process
+        workers(int): Worker processes (None: all cores). Nothing is set
+                      for a single process, which keeps every BLAS thread.
+
+    Returns:
+        bool: True if the variables were set in time
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return False
+    if 'numpy' in sys.modules:
+        warnings.warn("limit_blas_env was called after numpy was imported; the BLAS thread pools "
+                      "are not limited", RuntimeWarning, stacklevel=2)
+        return False
+    for var in BLAS_THREAD_VARS:
+        os.environ.setdefault(var, str(threads))
+    return True
+
+
+def blas_env_limited(threads=1):
+    """
+    Returns:
+        bool: True if the environment caps BLAS/OpenMP at threads per
+              process (OMP_NUM_THREADS or a library-specific variable)
+    """
+    for var in BLAS_THREAD_VARS:
+        try:
+            if int(os.environ[var]) <= threads:
+                return True
+        except (KeyError, ValueError):
+            pass
+    return False
@@ -0,0 +1,296 @@
+###################################
+# Compressed circuit cache        #
+###################################
+from compressor import Circuit, compress, compress_freeze, compress_freeze_support, compressed_stats, compress_freeze_stats
+import profiling
+import numpy as np
+import hashlib
+import json
+import os
+
+
+# Directory of the default cache. Unset: no caching.
+CACHE_ENV = 'ER_NOISE_CIRCUIT_CACHE'
+# Size bound of the default cache, in bytes.
+CACHE_SIZE_ENV = 'ER_NOISE_CIRCUIT_CACHE_BYTES'
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def _encode(circ_compressed):
+    qs = [q for c in circ_compressed for g in c for q in g]
+    sizes = [len(g) for c in circ_compressed for g in c]
+    layers = [len(c) for c in circ_compressed]
+    return (np.array(qs, dtype=np.int32), np.array(sizes, dtype=np.int8),
+            np.array(layers, dtype=np.int32))
+
+
+def _decode(qs, sizes, layers):
+    qs = qs.tolist()
+    circ = []
+    i = 0
+    k = 0
+    for n_gates in layers.tolist():
+        c = []
+        for size in sizes[k:k+n_gates].tolist():
+            # Resets are one-element lists, gates are tuples (see compress)
+            c.append([qs[i]] if size == 1 else tuple(qs[i:i+size]))
+            i += size
+        k += n_gates
+        circ.append(c)
+    return circ
+
+
+class CircuitCache:
+    """
+    Content-addressed disk cache of compressed circuits. The key is a hash
+    of the uncompressed circuit and of the frozen qubits, so the cached
+    result is valid for any (n, D, support) that produces the same past
+    causal cone, and is shared by every noise rate of a sweep. Each entry
+    is an .npz file holding the compressed circuit, its compressed_stats
+    and, for compress_freeze, the labels of the frozen qubits. Entries are
+    written atomically, so several processes can share one directory. When
+    the directory grows beyond max_bytes, the least recently used entries
+    are removed.
+
+    Args:
+        path(str): Cache directory, created if needed
+        max_bytes(int): Size bound of the directory
+    """
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Estimated size of the directory; rescanned on eviction
+        self._size = None
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(circ, frozen=None):
+        """
+        Args:
+            circ(list(list(tuple)) or Circuit): Uncompressed circuit
+            frozen(list): Frozen qubits (compress_freeze), or None (compress)
+
+        Returns:
+            str: Hex digest identifying the compression
+        """
+        if not isinstance(circ, Circuit):
+            circ = Circuit.from_list(circ)
+        h = hashlib.sha256()
+        h.update(np.ascontiguousarray(circ.gates, dtype=np.int32).tobytes())
+        h.update(np.asarray(circ.offsets, dtype=np.int64).tobytes())
+        h.update(b'compress' if frozen is None else json.dumps([int(q) for q in frozen]).encode())
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        """
+        Args:
+            key(str): See CircuitCache.key
+
+        Returns:
+            tuple: (compressed circuit, compressed_stats dict, frozen
+                   labels), or None if the key is not cached. The labels
+                   are None if the entry was stored without them.
+        """
+        fname = self._file(key)
+        try:
+            with np.load(fname) as f:
+                circ = _decode(f['qubits'], f['sizes'], f['layers'])
+                stats = json.loads(str(f['stats']))
+                labels = json.loads(str(f['frozen'])) if 'frozen' in f.files else None
+            os.utime(fname)
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        return circ, stats, labels
+
+    def put(self, key, circ_compressed, stats=None, labels=None):
+        """
+        Args:
+            key(str): See CircuitCache.key
+            circ_compressed(list): Output of compress or compress_freeze
+            stats(dict): compressed_stats of circ_compressed (computed if
+                         omitted)
+            labels(list): Labels of the frozen qubits in circ_compressed
+                          (see compressor.compress_freeze_support)
+        """
+        if stats is None:
+            stats = compressed_stats(circ_compressed)
+        qs, sizes, layers = _encode(circ_compressed)
+        tmp = os.path.join(self.path, '.{}.{}.npz'.format(key, os.getpid()))
+        extra = {} if labels is None else {'frozen': np.array(json.dumps(labels))}
+        np.savez(tmp, qubits=qs, sizes=sizes, layers=layers, stats=np.array(json.dumps(stats)), **extra)
+        os.replace(tmp, self._file(key))
+        if self._size is None:
+            self._size = sum(e[1] for e in self._entries())
+        else:
+            self._size += os.path.getsize(self._file(key))
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.npz') or name.startswith('.'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def compress(self, circ, frozen=None):
+        """
+        compress(circ) (or compress_freeze(circ, frozen)), read from the
+        cache if possible.
+
+        Returns:
+            list: Compressed circuit
+            dict: compressed_stats of the compressed circuit
+        """
+        return self._compress(circ, frozen)[:2]
+
+    def compress_support(self, circ, frozen):
+        """
+        compressor.compress_freeze_support(circ, frozen), read from the
+        cache if possible.
+
+        Returns:
+            list: Compressed circuit
+            list: Labels of the frozen qubits in the compressed circuit
+        """
+        circ_compressed, _, labels = self._compress(circ, frozen)
+        return circ_compressed, labels
+
+    def _compress(self, circ, frozen):
+        key = self.key(circ, frozen)
+        found = self.get(key)
+        # Frozen entries written without labels are recomputed once
+        if found is not None and (frozen is None or found[2] is not None):
+            self.hits += 1
+            profiling.count('circuit_cache.hit')
+            return found
+        self.misses += 1
+        profiling.count('circuit_cache.miss')
+        if frozen is None:
+            circ_compressed, labels = compress(circ), None
+        else:
+            circ_compressed, labels = compress_freeze_support(circ, frozen)
+        stats = compressed_stats(circ_compressed)
+        self.put(key, circ_compressed, stats, labels)
+        return circ_compressed, stats, labels
+
+
+_default = {}
+
+
+def default_cache():
+    """
+    Returns:
+        CircuitCache: The cache in the directory named by
+                      $ER_NOISE_CIRCUIT_CACHE (bounded by
+                      $ER_NOISE_CIRCUIT_CACHE_BYTES), or None if unset
+    """
+    path = os.environ.get(CACHE_ENV)
+    if not path:
+        return None
+    max_bytes = int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_BYTES))
+    if (path, max_bytes) not in _default:
+        _default[(path, max_bytes)] = CircuitCache(path, max_bytes)
+    return _default[(path, max_bytes)]
+
+
+def _resolve(cache):
+    if cache is None:
+        return default_cache()
+    if cache is False:
+        return None
+    if isinstance(cache, str):
+        return CircuitCache(cache)
+    return cache
+
+
+def cached_compress(circ, frozen=None, cache=None):
+    """
+    Drop-in replacement for compress(circ) (frozen=None) and
+    compress_freeze(circ, frozen).
+
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Frozen qubits
+        cache(CircuitCache, str or bool): Cache, or its directory. None uses
+                                          default_cache(); False disables
+                                          caching.
+
+    Returns:
+        list: Compressed circuit
+    """
+    cache = _resolve(cache)
+    if cache is None:
+        return compress(circ) if frozen is None else compress_freeze(circ, frozen)
+    return cache.compress(circ, frozen)[0]
+
+
+def cached_compress_support(circ, frozen, cache=None):
+    """
+    Drop-in replacement for compressor.compress_freeze_support.
+
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Frozen qubits
+        cache(CircuitCache, str or bool): See cached_compress
+
+    Returns:
+        list: Compressed circuit
+        list: Labels of the frozen qubits in the compressed circuit
+    """
+    cache = _resolve(cache)
+    if cache is None:
+        return compress_freeze_support(circ, frozen)
+    return cache.compress_support(circ, frozen)
+
+
+def cached_compress_freeze_stats(circ, frozen, keep_circuit=False, cache=None):
+    """
+    Drop-in replacement for compressor.compress_freeze_stats. On a cache
+    hit the statistics are read from the cache, without compressing.
+
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Frozen qubits
+        keep_circuit(bool): Also return the compressed circuit
+        cache(CircuitCache, str or bool): See cached_compress
+
+    Returns:
+        dict: See compressor.compressed_stats. With keep_circuit, the
+              compressed circuit is stored under 'circuit'.
+    """
+    cache = _resolve(cache)
+    if cache is None:
+        return compress_freeze_stats(circ, frozen, keep_circuit)
+    circ_compressed, stats = cache.compress(circ, frozen)
+    stats = dict(stats)
+    if keep_circuit:
+        stats['circuit'] = circ_compressed
+    return stats
@@ -2,19 +2,151 @@
 # Circuit compressor              #
 # Isaac H. Kim 2020/12/25         #
 ###################################
+from profiling import profiled
 import numpy as np
 import copy
 
 
+class Circuit:
+    """
+    Array-backed circuit. Equivalent to the list(list(tuple)) format, but
+    the gate endpoints are stored in a single int32 array.
+
+    Attributes:
+        gates(np.ndarray): (number of gates, 2) array of gate endpoints
+        offsets(np.ndarray): The gates of the k'th depth-1 circuit are
+                             gates[offsets[k]:offsets[k+1]]
+
+    The gates within each depth-1 circuit must act on distinct qubits.
+    Circuits are immutable, so the qubit list is computed once and cached.
+    Iterating over a Circuit (or indexing it) yields its depth-1 circuits
+    as lists of tuples, so it can be read like the list format.
+    """
+    def __init__(self, gates, offsets, check=True):
+        self.gates = np.asarray(gates, dtype=np.int32).reshape([-1, 2])
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.gates.setflags(write=False)
+        self.offsets.setflags(write=False)
+        # Sub-circuits of a valid circuit are valid, so internal callers
+        # building them pass check=False.
+        for k in range(len(self) if check else 0):
+            layer = self.gates[self.offsets[k]:self.offsets[k+1]]
+            if len(np.unique(layer)) != layer.size:
+                raise ValueError("Gates in a depth-1 circuit must act on distinct qubits.")
+        self._qubits = None
+
+    @classmethod
+    def from_list(cls, circ):
+        """
+        Args:
+            circ(list(list(tuple))): Circuit
+
+        Returns:
+            Circuit: The same circuit in array form
+        """
+        gates = [tuple(g) for c in circ for g in c]
+        offsets = np.cumsum([0] + [len(c) for c in circ])
+        return cls(np.array(gates, dtype=np.int32).reshape([-1, 2]), offsets)
+
+    def to_list(self):
+        """
+        Returns:
+            list(list(tuple)): The same circuit in list form
+        """
+        return list(self)
+
+    def qubits(self):
+        """
+        Returns:
+            list: The qubits appearing in the circuit, in the same order as
+                  qubits(self.to_list()).
+        """
+        if self._qubits is None:
+            flat = self.gates.ravel().tolist()
+            qs = []
+            for k in range(len(self)):
+                qs = list(set(qs + flat[2*self.offsets[k]:2*self.offsets[k+1]]))
+            self._qubits = qs
+        return list(self._qubits)
+
+    def layer_index(self):
+        """
+        Returns:
+            np.ndarray: Index of the depth-1 circuit containing each gate
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[i] for i in range(len(self))[k]]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("Circuit index out of range")
+        return [tuple(g) for g in self.gates[self.offsets[k]:self.offsets[k+1]].tolist()]
+
+    def __iter__(self):
+        gates = [tuple(g) for g in self.gates.tolist()]
+        offsets = self.offsets.tolist()
+        for k in range(len(self)):
+            yield gates[offsets[k]:offsets[k+1]]
+
+    def __repr__(self):
+        return "Circuit({})".format(self.to_list())
+
+
+def _cone_sweep(circ, supp):
+    """
+    Backward sweep over an array-backed circuit.
+
+    Args:
+        circ(Circuit): Circuit
+        supp(list): List of integers
+
+    Returns:
+        np.ndarray: Boolean mask of the qubits in the past causal cone
+        np.ndarray: Boolean mask of the gates in the past causal cone
+    """
+    size = max([int(circ.gates.max(initial=-1)) + 1] + [s + 1 for s in supp])
+    mask = np.zeros(size, dtype=bool)
+    mask[list(supp)] = True
+    keep = np.zeros(len(circ.gates), dtype=bool)
+    offsets = circ.offsets.tolist()
+    for k in np.flatnonzero(np.diff(circ.offsets))[::-1].tolist():
+        g = circ.gates[offsets[k]:offsets[k+1]]
+        hit = mask[g[:,0]] | mask[g[:,1]]
+        keep[offsets[k]:offsets[k+1]] = hit
+        mask[g[hit].ravel()] = True
+    return mask, keep
+
+
+@profiled()
 def ancestor_width(circ, supp, verbose=False):
     """
     Args:
-        circ(list(list(tuple))): Circuit
+        circ(list(list(tuple)) or Circuit): Circuit
         supp(list): List of integers
 
     Returns:
         int: Width of the past causal cone of supp
     """
+    if isinstance(circ, Circuit):
+        return int(_cone_sweep(circ, supp)[0].sum())
+    return bin(_ancestor_mask(circ, supp, verbose)).count('1')
+
+
+def _ancestor_mask(circ, supp, verbose=False):
+    """
+    Args:
+        circ(list(list(tuple))): Circuit
+        supp(list): List of integers
+
+    Returns:
+        int: Bitmask of the qubits in the past causal cone of supp
+    """
     circ_rev= circ[::-1]
     supp_coded = 0
     for s in supp:
@@ -29,18 +161,24 @@ def ancestor_width(circ, supp, verbose=False):
                     supp_coded |= (1<<gate[1])
             elif (1<<gate[1]) & supp_coded:
                 supp_coded |= (1<<gate[0])
-    return bin(supp_coded).count('1')
+    return supp_coded
 
     
+@profiled()
 def pcc(circ, supp, verbose=False):
     """
     Args:
-        circ(list(list(tuple))): Circuit
+        circ(list(list(tuple)) or Circuit): Circuit
         supp(list): List of integers
 
     Returns:
         list(list(tuple)): Past causal cone of supp
+                           (a Circuit if circ is a Circuit)
     """
+    if isinstance(circ, Circuit):
+        keep = _cone_sweep(circ, supp)[1]
+        kept = np.concatenate([[0], np.cumsum(keep)])
+        return Circuit(circ.gates[keep], kept[circ.offsets], check=False)
     circ_rev= circ[::-1]
     circ_reduced = []
     supp_coded = 0
@@ -63,6 +201,88 @@ def pcc(circ, supp, verbose=False):
     return circ_reduced[::-1]
 
 
+def _cone_sweep_batch(circ, supps):
+    """
+    Backward sweep over an array-backed circuit for many supports at once.
+
+    Args:
+        circ(Circuit): Circuit
+        supps(list(list)): List of supports
+
+    Returns:
+        np.ndarray: (len(supps), number of qubits) boolean mask of the qubits
+                    in each past causal cone
+        np.ndarray: (len(supps), number of gates) boolean mask of the gates
+                    in each past causal cone
+    """
+    size = max([int(circ.gates.max(initial=-1)) + 1] + [s + 1 for supp in supps for s in supp])
+    mask = np.zeros((len(supps), size), dtype=bool)
+    for i, supp in enumerate(supps):
+        mask[i, list(supp)] = True
+    keep = np.zeros((len(supps), len(circ.gates)), dtype=bool)
+    offsets = circ.offsets.tolist()
+    for k in np.flatnonzero(np.diff(circ.offsets))[::-1].tolist():
+        g = circ.gates[offsets[k]:offsets[k+1]]
+        hit = mask[:, g[:,0]] | mask[:, g[:,1]]
+        keep[:, offsets[k]:offsets[k+1]] = hit
+        # The gates of a depth-1 circuit are disjoint, so no column repeats.
+        mask[:, g[:,0]] |= hit
+        mask[:, g[:,1]] |= hit
+    return mask, keep
+
+
+def ancestor_width_batch(circ, supps):
+    """
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        supps(list(list)): List of supports
+
+    Returns:
+        np.ndarray: Width of the past causal cone of each support
+    """
+    if not isinstance(circ, Circuit):
+        circ = Circuit.from_list(circ)
+    return _cone_sweep_batch(circ, supps)[0].sum(axis=1)
+
+
+def pcc_batch(circ, supps):
+    """
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        supps(list(list)): List of supports
+
+    Returns:
+        list: Past causal cone of each support, in the format of circ
+    """
+    is_array = isinstance(circ, Circuit)
+    if not is_array:
+        circ = Circuit.from_list(circ)
+    keep = _cone_sweep_batch(circ, supps)[1]
+    cones = []
+    for k in keep:
+        kept = np.concatenate([[0], np.cumsum(k)])
+        cone = Circuit(circ.gates[k], kept[circ.offsets], check=False)
+        cones.append(cone if is_array else cone.to_list())
+    return cones
+
+
+def gates_per_layer_batch(circ, supps):
+    """
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        supps(list(list)): List of supports
+
+    Returns:
+        np.ndarray: (len(supps), len(circ)) number of gates of each depth-1
+                    circuit that belong to the past causal cone of each support
+    """
+    if not isinstance(circ, Circuit):
+        circ = Circuit.from_list(circ)
+    keep = _cone_sweep_batch(circ, supps)[1]
+    kept = np.concatenate([np.zeros((len(supps), 1), dtype=np.int64), np.cumsum(keep, axis=1)], axis=1)
+    return kept[:, circ.offsets[1:]] - kept[:, circ.offsets[:-1]]
+
+
 def pcc_slower1(circ, supp, verbose=False):
     """
     Args:
@@ -119,11 +339,13 @@ def pcc_slower2(circ, supp, verbose=False):
 def qubits(circ):
     """
     Args:
-        circ(list(list(tuple))): Circuit
+        circ(list(list(tuple)) or Circuit): Circuit
 
     Returns:
         list: The list of qubits appearing in the circuit.
     """
+    if isinstance(circ, Circuit):
+        return circ.qubits()
     qs = []
     for c in circ:
         for g in c:
@@ -140,17 +362,28 @@ def circ_subtract(circ1, circ2):
     if circ2 is not a sub-circuit of circ1.
 
     Args:
-        circ1, circ2(list(list(tuple))): Circuits
+        circ1, circ2(list(list(tuple)) or Circuit): Circuits
 
     Returns:
-        list(list(tuple)): The remaining circuit
+        list(list(tuple)): The remaining circuit (a Circuit if circ1 is one)
     """
     if len(circ1) != len(circ2):
         raise ValueError("The inputs must have identical lengths.")
 
+    if isinstance(circ1, Circuit):
+        if not isinstance(circ2, Circuit):
+            circ2 = Circuit.from_list(circ2)
+        base = int(max(circ1.gates.max(initial=0), circ2.gates.max(initial=0))) + 1
+        def keys(c):
+            return (c.layer_index() * base + c.gates[:,0]) * base + c.gates[:,1]
+        remaining = ~np.isin(keys(circ1), keys(circ2))
+        kept = np.concatenate([[0], np.cumsum(remaining)])
+        return Circuit(circ1.gates[remaining], kept[circ1.offsets], check=False)
+
     circ_out = []
     for c1, c2 in zip(circ1, circ2):
-        circ_out.append([x for x in c1 if x not in c2])
+        c2_set = set(map(tuple, c2))
+        circ_out.append([x for x in c1 if tuple(x) not in c2_set])
     return circ_out
 
 
@@ -185,9 +418,44 @@ def rearrange_freeze_old(circ, frozen):
     return circ_out
 
 
+@profiled()
 def rearrange_freeze(circ, frozen):
     """
     Rearrange the circuit for width reduction
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Qubits that shouldn't be reset.
+    Returns:
+        list: Rearranged circuit
+    """
+    return _rearrange_incremental(circ, frozen)
+
+
+def rearrange(circ):
+    """
+    Rearrange the circuit for width reduction
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+
+    Returns:
+        list: Rearranged circuit
+    """
+    return _rearrange_incremental(circ, [])
+
+
+def _rearrange_incremental(circ, frozen):
+    """
+    Greedy rearrangement shared by rearrange and rearrange_freeze. At every
+    step the qubit with the narrowest past causal cone is picked (ties go
+    to the first qubit returned by qubits), its cone is moved to the output
+    and the qubit is reset unless it is frozen.
+
+    The cone of every remaining qubit is kept as a bitmask together with its
+    width. Removing a cone can only change the cones that share a qubit with
+    it, so only those entries are refreshed, from a single forward sweep of
+    the remaining circuit (_ancestor_masks) rather than one backward sweep
+    per qubit.
+
     Args:
         circ(list(list(tuple))): Circuit
         frozen(list): Qubits that shouldn't be reset.
@@ -196,58 +464,64 @@ def rearrange_freeze(circ, frozen):
     """
     circ_temp = circ
     circ_out = []
-    while len(qubits(circ_temp)) > 0:
-        qs = qubits(circ_temp)
+    cones = {}
+    qs = qubits(circ_temp)
+    while len(qs) > 0:
+        stale = [q for q in qs if not q in cones]
+        if stale:
+            masks = _ancestor_masks(circ_temp)
+            for q in stale:
+                cones[q] = (masks[q], bin(masks[q]).count('1'))
         n_q_min = len(qs)
         q_min_idx = qs[0]
         for q in qs:
-            width_temp = ancestor_width(circ_temp, [q])
+            width_temp = cones[q][1]
             if width_temp < n_q_min:
                 n_q_min = width_temp
                 q_min_idx = q
+        removed = cones[q_min_idx][0]
         mypcc = pcc(circ_temp, [q_min_idx])
         circ_temp = circ_subtract(circ_temp, mypcc)
         circ_out += [c for c in mypcc if len(c)>0]
-#        if q_min_idx in frozen:
-#            print("{} is frozen".format(q_min_idx))
-#            print("Frozen list={}".format(frozen))
         if not (q_min_idx in frozen):
             circ_out += [q_min_idx]
+        cones = {q: cone for q, cone in cones.items() if not (cone[0] & removed)}
+        qs = qubits(circ_temp)
     return circ_out
 
 
-def rearrange(circ):
+def _ancestor_masks(circ):
     """
-    Rearrange the circuit for width reduction
+    Past causal cones of every qubit at once. Sweeping forward in time, the
+    two qubits of a gate both inherit the union of their ancestor sets.
+    Gates within a depth-1 circuit are visited in reverse, which matches the
+    order in which pcc and ancestor_width visit them.
+
     Args:
         circ(list(list(tuple))): Circuit
 
     Returns:
-        list: Rearranged circuit
+        dict: Bitmask of the past causal cone of each qubit in circ
     """
-    circ_temp = circ
-    circ_out = []
-    while len(qubits(circ_temp)) > 0:
-        qs = qubits(circ_temp)
-        n_q_min = len(qs)
-        q_min_idx = qs[0]
-        for q in qs:
-            pcc_temp = pcc(circ_temp, [q])
-            if len(qubits(pcc_temp)) < n_q_min:
-                n_q_min = len(qubits(pcc_temp))
-                q_min_idx = q
-        mypcc = pcc(circ_temp, [q_min_idx])
-        circ_temp = circ_subtract(circ_temp, mypcc)
-        circ_out += [c for c in mypcc if len(c)>0]
-        circ_out += [q_min_idx]
-    return circ_out
-
-
+    if isinstance(circ, Circuit):
+        gates = circ.gates.tolist()
+        offsets = circ.offsets.tolist()
+        circ = [gates[offsets[k]:offsets[k+1]] for k in range(len(offsets)-1)]
+    masks = {}
+    for unitcirc in circ:
+        for gate in unitcirc[::-1]:
+            mask = masks.get(gate[0], 1<<gate[0]) | masks.get(gate[1], 1<<gate[1])
+            masks[gate[0]] = mask
+            masks[gate[1]] = mask
+    return masks
+
+
+@profiled()
 def compress(circ):
     """
     Compress the circuit for width reduction
     Args:
-        circ(list(list(tuple))): Circuit
+        circ(list(list(tuple)) or Circuit): Circuit
 
     Returns:
         list: Compressed circuit
@@ -283,15 +557,38 @@ def compress(circ):
     return circ_compressed
 
 
+@profiled()
 def compress_freeze(circ, frozen):
     """
     Compress the circuit for width reduction
     Args:
-        circ(list(list(tuple))): Circuit
+        circ(list(list(tuple)) or Circuit): Circuit
         frozen(list): Frozen qubits. (They shouldn't be reset.)
     Returns:
         list: Compressed circuit
     """
+    return _compress_freeze(circ, frozen)[0]
+
+
+@profiled('compress_freeze')
+def compress_freeze_support(circ, frozen):
+    """
+    compress_freeze, together with the labels the frozen qubits get in the
+    compressed circuit. Frozen qubits are never reset, so their labels are
+    not reused by other qubits.
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Frozen qubits
+    Returns:
+        list: Compressed circuit
+        list: Label of each frozen qubit in the compressed circuit, in the
+              order of frozen (None if the qubit does not appear in circ)
+    """
+    circ_compressed, assignment = _compress_freeze(circ, frozen)
+    return circ_compressed, [assignment.get(q) for q in frozen]
+
+
+def _compress_freeze(circ, frozen):
     circ_compressed = []
     q_max = 0
     if qubits(circ):
@@ -322,7 +619,7 @@ def compress_freeze(circ, frozen):
             c_compressed.append([assignment[c]])
         if len(c_compressed)>0:
             circ_compressed.append(c_compressed)
-    return circ_compressed
+    return circ_compressed, assignment
         
 
 def optimal_width(circ):
@@ -371,3 +668,37 @@ def depth_width_reduced_freeze(circ, frozen):
         int: Optimal width
     """
     return len(compress_freeze(circ, frozen))
+
+
+def compressed_stats(circ_compressed):
+    """
+    Summary of a compressed circuit
+    Args:
+        circ_compressed(list): Output of compress or compress_freeze
+    Returns:
+        dict: width, depth, volume (width * depth) and resets (number of
+              reset operations)
+    """
+    width = len(qubits(circ_compressed))
+    depth = len(circ_compressed)
+    resets = sum(1 for c in circ_compressed for g in c if len(g)==1)
+    return {'width': width, 'depth': depth, 'volume': width*depth, 'resets': resets}
+
+
+def compress_freeze_stats(circ, frozen, keep_circuit=False):
+    """
+    Width, depth, volume and number of resets of the width-reduced circuit,
+    from a single compression.
+    Args:
+        circ(list(list(tuple)) or Circuit): Circuit
+        frozen(list): Frozen qubits
+        keep_circuit(bool): Also return the compressed circuit
+    Returns:
+        dict: See compressed_stats. With keep_circuit, the compressed
+              circuit is stored under 'circuit'.
+    """
+    circ_compressed = compress_freeze(circ, frozen)
+    stats = compressed_stats(circ_compressed)
+    if keep_circuit:
+        stats['circuit'] = circ_compressed
+    return stats
@@ -0,0 +1,223 @@
+###################################
+# Command-line sweeps             #
+###################################
+# Run from this directory, e.g.
+#
+#   python -m er_noise sweep --dim 1d --n 8 --D 1 2 3 4 5 --metric width depth volume
+#   python -m er_noise sweep --dim 2d --n 2 --D 1 2 3 4 --p 0.001 0.002 \
+#       --metric noise extrapolation naive --samples 500 --output scaling.jsonl
+#
+# The whole grid runs in one process, so the DMERA circuits (dmera_*_circuit),
+# memoized cone statistics and the compressed-circuit cache are shared by all
+# grid points. Every grid point prints one summary line and, with --output,
+# appends one JSON object to the output file. With --profile, every grid
+# point also prints the time spent in pcc, compression and simulation.
+from blas_threads import limit_blas_env
+import argparse
+if __name__ == '__main__':
+    # One BLAS thread per worker process, unless --workers 1. Must run
+    # before numpy is imported; set OMP_NUM_THREADS to override.
+    _pre = argparse.ArgumentParser(add_help=False)
+    _pre.add_argument('--workers', type=int, default=None)
+    limit_blas_env(workers=_pre.parse_known_args()[0].workers)
+from stats import RunningStats, StatsTable
+from sweep import sweep
+from checkpoint import ResultStore, make_key
+from circuit_cache import CACHE_ENV
+import profiling
+import D1_v2
+import D2_v2
+import D2_v3
+import noise_study_1D
+import noise_study_2D
+import json
+import os
+
+
+GEOMETRIC_METRICS = ('width', 'depth', 'volume')
+NOISE_METRICS = ('noise', 'extrapolation', 'naive')
+
+# dim: (stats_pcc_dmera_*, dmera_*_circuit, linear lattice size at n scales,
+#       noise estimator module)
+_DIMS = {
+    '1d': (D1_v2.stats_pcc_dmera_1d, D1_v2.dmera_1d_circuit, lambda n: 2**n, noise_study_1D),
+    '2d': (D2_v2.stats_pcc_dmera_2d, D2_v2.dmera_2d_circuit, lambda n: 2**n, noise_study_2D),
+    '2d_v3': (D2_v3.stats_pcc_dmera_2d, D2_v3.dmera_2d_circuit, lambda n: 3**n, None),
+}
+
+
+def supports(dim, n, l=2):
+    """
+    Supports scanned by the geometric metrics.
+
+    Args:
+        dim(str): '1d', '2d' or '2d_v3'
+        n(int): Number of scales
+        l(int): Support size. In 1D, l consecutive sites. In 2D, l=2 gives
+                the horizontal and vertical nearest-neighbor pairs of every
+                site (as in the spacetime_2d scripts), and l>2 the l x l
+                patch at every site.
+
+    Returns:
+        list(list): Supports
+    """
+    L = _DIMS[dim][2](n)
+    if dim == '1d':
+        return [[(x+k)%L for k in range(l)] for x in range(L)]
+    supps = []
+    for x in range(L):
+        for y in range(L):
+            if l == 2:
+                supps.append([(x,y), ((x+1)%L,y)])
+                supps.append([(x,y), (x,(y+1)%L)])
+            else:
+                supps.append([((x+a)%L,(y+b)%L) for a in range(l) for b in range(l)])
+    return supps
+
+
+def geometric_point(dim, n, D, l=2, workers=None, store=None, shard=None, verbose=False):
+    """
+    Width, depth and volume of the compressed past causal cone of every
+    support (see supports).
+
+    Returns:
+        dict: {metric: RunningStats.snapshot()}
+    """
+    func, builder = _DIMS[dim][:2]
+    metric = 'stats_pcc_dmera_{}'.format(dim)
+    args = [(n, D, supp) for supp in supports(dim, n, l)]
+    stats = StatsTable()
+    sweep(func, args, workers=workers, initializer=builder, initargs=(n, D), verbose=verbose,
+          stats=stats, keep_results=False, store=store, shard=shard,
+          key=lambda a: make_key(metric, n, D, support=a[2]))
+    return {m: stats[m].snapshot() for m in GEOMETRIC_METRICS if m in stats}
+
+
+def noise_point(dim, metric, n, D, p, samples, workers=None, seed=None, store=None, shard=None, verbose=False,
+                backend='density', trajectories=None, reduced=False, tol=None, rtol=None, max_time=None):
+    """
+    Noise metric at one grid point, from the estimators of noise_study_1D or
+    noise_study_2D.
+
+    Returns:
+        dict: RunningStats.snapshot() of the sampled values
+    """
+    module = _DIMS[dim][3]
+    if module is None:
+        raise ValueError("No noise estimators for dim={}".format(dim))
+    stats = RunningStats()
+    common = dict(verbose=verbose, workers=workers, seed=seed, stats=stats, store=store, shard=shard)
+    adaptive = dict(tol=tol, rtol=rtol, max_time=max_time)
+    if metric == 'noise':
+        module.noise_estimate_pcc(n, D, p, samples, backend=backend, trajectories=trajectories, reduced=reduced,
+                                  **common, **adaptive)
+    elif metric == 'extrapolation':
+        module.extrapolation_estimate_pcc(n, D, p, samples, **common, **adaptive)
+    else:
+        module.noise_estimate_pcc_naive(n, D, p, samples, **common)
+    return stats.snapshot()
+
+
+def run_sweep(args):
+    """
+    Run the grid described by the parsed command-line arguments.
+
+    Returns:
+        list(dict): One row per grid point and metric
+    """
+    geometric = [m for m in args.metric if m in GEOMETRIC_METRICS]
+    noisy = [m for m in args.metric if m in NOISE_METRICS]
+    if noisy and _DIMS[args.dim][3] is None:
+        raise SystemExit("noise metrics are not available for --dim {}".format(args.dim))
+    if noisy and not args.p:
+        raise SystemExit("noise metrics need --p")
+    if args.backend == 'trajectory' and args.trajectories is None:
+        raise SystemExit("--backend trajectory needs --trajectories")
+    if args.circuit_cache:
+        # Set in the environment so that worker processes share the cache
+        os.environ[CACHE_ENV] = args.circuit_cache
+    store = ResultStore(args.checkpoint) if args.checkpoint else None
+    shard = tuple(int(k) for k in args.shard.split('/')) if args.shard else None
+
+    rows = []
+    out = open(args.output, 'a') if args.output else None
+
+    def report(row):
+        rows.append(row)
+        params = " ".join("{}={}".format(k, row[k]) for k in ('dim', 'n', 'D', 'p', 'l', 'metric') if row.get(k) is not None)
+        print("{}: max={} mean={} std={} sem={} count={}".format(
+            params, row['max'], row['mean'], row['std'], row['sem'], row['count']))
+        if out is not None:
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+
+    if args.profile:
+        profiling.enable()
+    try:
+        for n in args.n:
+            for D in args.D:
+                if geometric:
+                    for l in args.l:
+                        summary = geometric_point(args.dim, n, D, l, args.workers, store, shard,
+                                                  args.verbose)
+                        for m in geometric:
+                            report(dict(dim=args.dim, n=n, D=D, l=l, metric=m, **summary[m]))
+                        if args.profile:
+                            print(profiling.report(profiling.pop()))
+                for p in args.p if noisy else []:
+                    for m in noisy:
+                        summary = noise_point(args.dim, m, n, D, p, args.samples, args.workers, args.seed, store,
+                                              shard, args.verbose, args.backend, args.trajectories, args.reduced,
+                                              args.tol, args.rtol, args.max_time)
+                        report(dict(dim=args.dim, n=n, D=D, p=p, metric=m, **summary))
+                        if args.profile:
+                            print(profiling.report(profiling.pop()))
+    finally:
+        if args.profile:
+            profiling.disable()
+        if out is not None:
+            out.close()
+        if store is not None:
+            store.close()
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='er_noise', description="Sweeps over DMERA past causal cones.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('sweep', help="Run a parameter grid",
+                       formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    s.add_argument('--dim', choices=sorted(_DIMS), default='1d', help="Lattice")
+    s.add_argument('--metric', nargs='+', choices=GEOMETRIC_METRICS + NOISE_METRICS, default=['width'])
+    s.add_argument('--n', nargs='+', type=int, required=True, help="Numbers of scales")
+    s.add_argument('--D', nargs='+', type=int, required=True, help="Numbers of cycles per scale")
+    s.add_argument('--p', nargs='+', type=float, default=[], help="Noise rates (noise metrics)")
+    s.add_argument('--l', nargs='+', type=int, default=[2], help="Support sizes (geometric metrics)")
+    s.add_argument('--samples', type=int, default=500, help="Samples per grid point (noise metrics)")
+    s.add_argument('--seed', type=int, default=None, help="Root seed (noise metrics)")
+    s.add_argument('--workers', type=int, default=None, help="Processes (default: all cores)")
+    s.add_argument('--backend', choices=('density', 'trajectory'), default='density')
+    s.add_argument('--trajectories', type=int, default=None,
+                   help="Trajectories per sample (trajectory backend). The estimate is an upper bound that "
+                   "only converges for well over 2^width trajectories")
+    s.add_argument('--reduced', action='store_true')
+    s.add_argument('--tol', type=float, default=None, help="Target standard error (noise and extrapolation)")
+    s.add_argument('--rtol', type=float, default=None, help="Target relative standard error")
+    s.add_argument('--max-time', type=float, default=None, help="Time budget per grid point, in seconds")
+    s.add_argument('--checkpoint', default=None, help="SQLite checkpoint file (noise metrics need --seed)")
+    s.add_argument('--shard', default=None, help="index/count: run one shard of every grid point")
+    s.add_argument('--circuit-cache', default=None, help="Directory of the compressed-circuit cache")
+    s.add_argument('--output', default=None, help="Append one JSON line per grid point and metric")
+    s.add_argument('--profile', action='store_true', help="Report timers and counters after every grid point")
+    s.add_argument('--verbose', action='store_true')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'sweep':
+        run_sweep(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+###################################
+# Parallel Monte Carlo sampling   #
+###################################
+from sweep import sweep
+from stats import RunningStats, StatsTable
+from blas_threads import BLAS_THREAD_VARS, blas_env_limited
+import numpy as np
+import warnings
+import time
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+def limit_blas_threads(threads=1):
+    """
+    Limit the BLAS/OpenMP thread pools of this process, so that many worker
+    processes do not oversubscribe the cores. This needs threadpoolctl:
+    once numpy is loaded, the pools can no longer be resized through the
+    environment (see blas_threads.limit_blas_env).
+
+    Args:
+        threads(int): Threads per process
+
+    Returns:
+        bool: True if the pools were limited
+    """
+    if threadpool_limits is None:
+        return False
+    threadpool_limits(limits=threads)
+    return True
+
+
+def _check_blas_threads(threads):
+    # Warn, in the parent, when the workers' pools cannot be limited
+    if threadpool_limits is None and not blas_env_limited(threads):
+        warnings.warn("threadpoolctl is not installed and {} is not set: every worker process runs a full "
+                      "BLAS thread pool. Install threadpoolctl, or call blas_threads.limit_blas_env() "
+                      "before importing numpy.".format(BLAS_THREAD_VARS[0]), RuntimeWarning, stacklevel=3)
+
+
+def _init_sampler(threads, initializer, initargs):
+    limit_blas_threads(threads)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def sample_seeds(samples, seed=None):
+    """
+    Independent seed sequences, one per sample.
+
+    Args:
+        samples(int): Number of samples
+        seed(int or numpy.random.SeedSequence): Root seed. Fresh entropy if
+                                                omitted.
+
+    Returns:
+        list(numpy.random.SeedSequence): Children of the root seed
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(samples)
+
+
+def run_samples(func, args, samples, seed=None, workers=None, threads=1, initializer=None, initargs=(), verbose=False, stats=None,
+                store=None, key=None, shard=None):
+    """
+    Evaluate func(*args, seed_i) for samples independent seeds seed_i.
+
+    Every sample gets its own child of the root seed, so the results only
+    depend on seed, not on the number of workers or how the samples are
+    split between them.
+
+    Args:
+        func(callable): Module-level function; its last argument is a
+                        numpy.random.SeedSequence
+        args(tuple): Arguments shared by all samples
+        samples(int): Number of samples
+        seed(int or numpy.random.SeedSequence): Root seed
+        workers(int): Number of processes (see sweep.sweep)
+        threads(int): BLAS threads per worker. Applied through
+                      threadpoolctl; without it, a RuntimeWarning is
+                      issued unless the environment already limits
+                      the pools (see blas_threads).
+        initializer(callable): Called once per worker as
+                               initializer(*initargs)
+        initargs(tuple): Arguments of initializer
+        verbose(bool): Print a snapshot of the statistics as chunks complete
+        stats(RunningStats): Fed with every (numeric) result as it arrives
+        store(checkpoint.ResultStore): Checkpoint store (see sweep.sweep).
+                                       Requires seed, so that a restarted
+                                       run draws the same samples.
+        key(callable): key(seed_i) is the store key of a sample
+        shard(tuple): (index, count), see sweep.sweep
+
+    Returns:
+        list: func(*args, seed_i) for each sample, in order
+    """
+    if store is not None and seed is None:
+        raise ValueError("store requires a seed")
+    calls = [tuple(args) + (s,) for s in sample_seeds(samples, seed)]
+    table = None if stats is None else StatsTable({'value': stats})
+    call_key = None if key is None else (lambda a: key(a[-1]))
+    if workers == 1:
+        results, _ = sweep(func, calls, workers=1, initializer=initializer, initargs=initargs,
+                           verbose=verbose, stats=table, store=store, key=call_key, shard=shard)
+    else:
+        _check_blas_threads(threads)
+        results, _ = sweep(func, calls, workers=workers, initializer=_init_sampler,
+                           initargs=(threads, initializer, initargs), verbose=verbose,
+                           stats=table, store=store, key=call_key, shard=shard)
+    return results
+
+
+def sample_until(estimate, samples, tol=None, rtol=None, max_time=None, round_size=50, seed=None, stats=None, verbose=False):
+    """
+    Sample in rounds until the standard error of the mean is small enough.
+
+    estimate(k, seed_r, stats) must return a list of k new results and feed
+    them to stats. Rounds of at most round_size samples are run until the
+    standard error of the mean is at most tol, or at most rtol*|mean|, or
+    samples results were taken, or max_time seconds have elapsed, whichever
+    comes first.
+
+    Args:
+        estimate(callable): Runs one round
+        samples(int): Maximum number of samples
+        tol(float): Absolute target standard error
+        rtol(float): Target standard error relative to the mean
+        max_time(float): Time budget in seconds, checked after each round
+        round_size(int): Samples per round
+        seed(int or numpy.random.SeedSequence): Root seed. Round r is given
+                                                the r-th child; None is
+                                                passed on if omitted.
+        stats(RunningStats): Statistics of the results, fed by estimate.
+                             Should be empty; its sem is the achieved
+                             precision.
+        verbose(bool): Print the precision after every round
+
+    Returns:
+        list: All results, in order
+    """
+    if stats is None:
+        stats = RunningStats()
+    if seed is not None and not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    results = []
+    start = time.perf_counter()
+    while len(results) < samples:
+        k = min(round_size, samples - len(results))
+        results += estimate(k, None if seed is None else seed.spawn(1)[0], stats)
+        if verbose:
+            print("{} samples: mean={}, sem={}".format(stats.count, stats.mean, stats.sem))
+        if tol is not None and stats.sem <= tol:
+            break
+        if rtol is not None and stats.sem <= rtol * abs(stats.mean):
+            break
+        if max_time is not None and time.perf_counter() - start >= max_time:
+            break
+    return results
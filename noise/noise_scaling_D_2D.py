@@ -1,19 +1,34 @@
+from blas_threads import limit_blas_env
+# Processes the samples are split over (None: all cores)
+workers = None
+# One BLAS thread per worker process (unless workers=1). Must run before
+# numpy is imported; set OMP_NUM_THREADS to override.
+limit_blas_env(workers=workers)
 from noise_study_2D import noise_estimate_pcc, noise_estimate_pcc_naive, extrapolation_estimate_pcc
-import numpy as np
+from stats import RunningStats
+from checkpoint import ResultStore
 
 
 ns = [2]
 p = 0.001
 Ds = [1, 2, 3, 4]
 samples = 500
+# Checkpoint file (None: no checkpointing). Completed samples are skipped
+# when the script is rerun, which needs a fixed seed. shard=(index, count)
+# runs one part of the samples, see checkpoint.merge_stores.
+checkpoint = None
+seed = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
 
 for n in ns:
     print("n={}".format(n))
     for D in Ds:
         print("D={}".format(D))
-        results = noise_estimate_pcc(n, D, p, samples, verbose=False)
-        results_ext = extrapolation_estimate_pcc(n, D, p, samples, verbose=False)
-        results_naive = noise_estimate_pcc_naive(n, D, p, samples)
-        print("naive = {}+-{}".format(np.mean(results_naive), np.std(results_naive)))
-        print("precise = {}+-{}".format(np.mean(results), np.std(results)))
-        print("Extrapolated = {}+-{}".format(np.mean(results_ext), np.std(results_ext)))
+        precise, extrapolated, naive = RunningStats(), RunningStats(), RunningStats()
+        noise_estimate_pcc(n, D, p, samples, verbose=False, workers=workers, stats=precise, seed=seed, store=store, shard=shard)
+        extrapolation_estimate_pcc(n, D, p, samples, verbose=False, workers=workers, stats=extrapolated, seed=seed, store=store, shard=shard)
+        noise_estimate_pcc_naive(n, D, p, samples, workers=workers, stats=naive, seed=seed, store=store, shard=shard)
+        print("naive = {}+-{}".format(naive.mean, naive.std))
+        print("precise = {}+-{}".format(precise.mean, precise.std))
+        print("Extrapolated = {}+-{}".format(extrapolated.mean, extrapolated.std))
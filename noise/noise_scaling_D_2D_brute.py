@@ -1,18 +1,32 @@
+from blas_threads import limit_blas_env
+# Processes used to scan the supports (None: all cores)
+workers = None
+# One BLAS thread per worker process (unless workers=1). Must run before
+# numpy is imported; set OMP_NUM_THREADS to override.
+limit_blas_env(workers=workers)
 from noise_study_2D_brute import noise_estimate_pcc, noise_estimate_pcc_naive, extrapolation_estimate_pcc
-import numpy as np
+from stats import RunningStats
+from checkpoint import ResultStore
 
 
 ns = [2]
 p = 0.001
 Ds = [1, 2, 3, 4, 5]
+# Checkpoint file (None: no checkpointing). Completed supports are skipped
+# when the script is rerun. shard=(index, count) runs one part of the scan,
+# see checkpoint.merge_stores.
+checkpoint = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
 
 for n in ns:
     print("n={}".format(n))
     for D in Ds:
         print("D={}".format(D))
-        results = noise_estimate_pcc(n, D, p, verbose=True)
-        results_ext = extrapolation_estimate_pcc(n, D, p, verbose=False)
-        results_naive = noise_estimate_pcc_naive(n, D, p)
-        print("naive = {}+-{}".format(np.mean(results_naive), np.std(results_naive)))
-        print("precise = {}+-{}".format(np.mean(results), np.std(results)))
-        print("Extrapolated = {}+-{}".format(np.mean(results_ext), np.std(results_ext)))
+        precise, extrapolated, naive = RunningStats(), RunningStats(), RunningStats()
+        noise_estimate_pcc(n, D, p, verbose=True, workers=workers, stats=precise, store=store, shard=shard)
+        extrapolation_estimate_pcc(n, D, p, verbose=False, workers=workers, stats=extrapolated, store=store, shard=shard)
+        noise_estimate_pcc_naive(n, D, p, workers=workers, stats=naive, store=store, shard=shard)
+        print("naive = {}+-{}".format(naive.mean, naive.std))
+        print("precise = {}+-{}".format(precise.mean, precise.std))
+        print("Extrapolated = {}+-{}".format(extrapolated.mean, extrapolated.std))
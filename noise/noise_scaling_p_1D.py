@@ -1,17 +1,35 @@
+from blas_threads import limit_blas_env
+# Processes the samples are split over (None: all cores)
+workers = None
+# One BLAS thread per worker process (unless workers=1). Must run before
+# numpy is imported; set OMP_NUM_THREADS to override.
+limit_blas_env(workers=workers)
 from noise_study_1D import noise_estimate_pcc, noise_estimate_pcc_naive, extrapolation_estimate_pcc
-import numpy as np
+from stats import RunningStats
+from checkpoint import ResultStore
 
 
 n = 8
 ps = [0.0001*2**i for i in range(10)]
 D = 5
 samples = 500
+# Stop sampling a noise rate once the standard error of the mean is below
+# rtol*mean (samples is then only an upper bound)
+rtol = 0.02
+# Checkpoint file (None: no checkpointing). Completed samples are skipped
+# when the script is rerun, which needs a fixed seed. shard=(index, count)
+# runs one part of the samples, see checkpoint.merge_stores.
+checkpoint = None
+seed = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
 
 for p in ps:
     print("p={}".format(p))
-    results = noise_estimate_pcc(n, D, p, samples, verbose=True)
-    results_ext = extrapolation_estimate_pcc(n, D, p, samples, verbose=True)
-    results_naive = noise_estimate_pcc_naive(n, D, p, samples)
-    print("naive = {}+-{}".format(np.mean(results_naive), np.std(results_naive)))
-    print("precise = {}+-{}".format(np.mean(results), np.std(results)))
-    print("Extrapolated = {}+-{}".format(np.mean(results_ext), np.std(results_ext)))
+    precise, extrapolated, naive = RunningStats(), RunningStats(), RunningStats()
+    noise_estimate_pcc(n, D, p, samples, verbose=True, workers=workers, stats=precise, rtol=rtol, seed=seed, store=store, shard=shard)
+    extrapolation_estimate_pcc(n, D, p, samples, verbose=True, workers=workers, stats=extrapolated, rtol=rtol, seed=seed, store=store, shard=shard)
+    noise_estimate_pcc_naive(n, D, p, samples, workers=workers, stats=naive, seed=seed, store=store, shard=shard)
+    print("naive = {}+-{}".format(naive.mean, naive.std))
+    print("precise = {}+-{} (sem={}, samples={})".format(precise.mean, precise.std, precise.sem, precise.count))
+    print("Extrapolated = {}+-{} (sem={}, samples={})".format(extrapolated.mean, extrapolated.std, extrapolated.sem, extrapolated.count))
@@ -1,10 +1,73 @@
-from sim import noise_study, extrapolation_study
-from D1_v2 import pcc_dmera_1d
-from compressor import compress
+from sim import noise_study, noise_study_trajectory, extrapolation_study, trace_norm
+from D1_v2 import pcc_dmera_1d, dmera_1d_circuit
+from circuit_cache import cached_compress, cached_compress_support
+from montecarlo import run_samples, sample_until
+from checkpoint import make_key
 import numpy as np
 
 
-def noise_estimate_pcc(n, D, p, samples, verbose=False):
+def _random_support(n, rng):
+    randsite = int(rng.integers(2**n))
+    return [randsite, (randsite+1)%(2**n)]
+
+
+def _noise_support(n, D, p, supp, backend, trajectories, reduced, rng=None):
+    labels = None
+    if reduced:
+        circ, labels = cached_compress_support(pcc_dmera_1d(n, D, supp), supp)
+    else:
+        circ = cached_compress(pcc_dmera_1d(n, D, supp))
+    if backend == 'trajectory':
+        return noise_study_trajectory(circ, p, trajectories, rng=rng)
+    else:
+        return trace_norm(noise_study(circ, p, reduced=reduced, rng=rng, support=labels))
+
+
+def _noise_sample(n, D, p, backend, trajectories, reduced, seed):
+    rng = np.random.default_rng(seed)
+    return _noise_support(n, D, p, _random_support(n, rng), backend, trajectories, reduced, rng)
+
+
+def noise_estimate_pcc(n, D, p, samples, verbose=False, backend='density', trajectories=None, reduced=False, workers=1, seed=None, stats=None, tol=None, rtol=None, max_time=None, round_size=50, store=None, shard=None):
+    """
+    backend='density' evolves full density matrices with noise_study.
+    backend='trajectory' uses noise_study_trajectory with the given number
+    of trajectories per sample, trading 4^n memory for 2^n per trajectory.
+    It overestimates the trace norm unless trajectories is well above 2^n
+    for the compressed width n; there is no default.
+    If reduced is True (density backend only), the support is frozen during
+    compression, noise_study discards qubits as soon as they are reset and
+    the trace norm is taken on the reduced state of the support.
+    If workers != 1 or seed is given, the samples are split over worker
+    processes (workers=None uses all cores), each sample with its own
+    random stream spawned from seed (see montecarlo.run_samples). The
+    results then only depend on seed.
+    If stats (a stats.RunningStats) is given, it is fed with every result
+    as it becomes available.
+    If tol, rtol or max_time is given, samples is only an upper bound:
+    sampling proceeds in rounds of round_size and stops once the standard
+    error of the mean is at most tol (or rtol*|mean|), or after max_time
+    seconds (see montecarlo.sample_until). The achieved precision is
+    stats.sem.
+    If store (a checkpoint.ResultStore) is given, samples already in the
+    store are not recomputed and new ones are appended to it; this needs a
+    seed. shard=(index, count) only computes every count-th sample, so
+    that one run can be split over several machines and the stores merged
+    with checkpoint.merge_stores.
+    """
+    if backend not in ('density', 'trajectory'):
+        raise ValueError("Unknown backend: {}".format(backend))
+    if backend == 'trajectory' and trajectories is None:
+        raise ValueError("backend='trajectory' needs the number of trajectories")
+    if tol is not None or rtol is not None or max_time is not None:
+        def estimate(k, seed_r, stats_r):
+            return noise_estimate_pcc(n, D, p, k, verbose, backend, trajectories, reduced, workers, seed_r, stats_r, store=store, shard=shard)
+        return sample_until(estimate, samples, tol, rtol, max_time, round_size, seed, stats, verbose)
+    if workers != 1 or seed is not None or store is not None:
+        metric = "noise_estimate_pcc_1d({}, {}, {})".format(backend, trajectories, reduced)
+        return run_samples(_noise_sample, (n, D, p, backend, trajectories, reduced), samples,
+                           seed, workers, initializer=dmera_1d_circuit, initargs=(n, D), verbose=verbose, stats=stats, store=store, shard=shard,
+                           key=lambda s: make_key(metric, n, D, p, seed=s))
     results = []
     for i in range(samples):
         if verbose:
@@ -12,12 +75,41 @@ def noise_estimate_pcc(n, D, p, samples, verbose=False):
         randsite = np.random.randint(2**n)
         if verbose:
             print("randsite = {}".format(randsite))
-        circ = compress(pcc_dmera_1d(n, D, [randsite, (randsite+1)%(2**n)]))
-        results.append(np.sum(abs(np.linalg.eigvals(noise_study(circ, p)))))
+        supp = [randsite, (randsite+1)%(2**n)]
+        results.append(_noise_support(n, D, p, supp, backend, trajectories, reduced))
+        if stats is not None:
+            stats.add(results[-1])
+            if verbose:
+                print(stats.snapshot())
     return results
 
 
-def extrapolation_estimate_pcc(n, D, p, samples, verbose=False):
+def _extrapolation_support(n, D, p, supp, scales, rng=None):
+    circ = cached_compress(pcc_dmera_1d(n, D, supp))
+    return trace_norm(extrapolation_study(circ, p, scales=scales, rng=rng))
+
+
+def _extrapolation_sample(n, D, p, scales, seed):
+    rng = np.random.default_rng(seed)
+    return _extrapolation_support(n, D, p, _random_support(n, rng), scales, rng)
+
+
+def extrapolation_estimate_pcc(n, D, p, samples, verbose=False, scales=(1, 2), workers=1, seed=None, stats=None, tol=None, rtol=None, max_time=None, round_size=50, store=None, shard=None):
+    """
+    scales are the noise scale factors used for Richardson extrapolation;
+    all of them are simulated in lockstep by extrapolation_study.
+    workers, seed, stats, tol, rtol, max_time, round_size, store and shard
+    are as in noise_estimate_pcc.
+    """
+    if tol is not None or rtol is not None or max_time is not None:
+        def estimate(k, seed_r, stats_r):
+            return extrapolation_estimate_pcc(n, D, p, k, verbose, scales, workers, seed_r, stats_r, store=store, shard=shard)
+        return sample_until(estimate, samples, tol, rtol, max_time, round_size, seed, stats, verbose)
+    if workers != 1 or seed is not None or store is not None:
+        metric = "extrapolation_estimate_pcc_1d({})".format(list(scales))
+        return run_samples(_extrapolation_sample, (n, D, p, scales), samples, seed, workers,
+                           initializer=dmera_1d_circuit, initargs=(n, D), verbose=verbose, stats=stats, store=store, shard=shard,
+                           key=lambda s: make_key(metric, n, D, p, seed=s))
     results = []
     for i in range(samples):
         if verbose:
@@ -25,12 +117,33 @@ def extrapolation_estimate_pcc(n, D, p, samples, verbose=False):
         randsite = np.random.randint(2**n)
         if verbose:
             print("randsite = {}".format(randsite))
-        circ = compress(pcc_dmera_1d(n, D, [randsite, (randsite+1)%(2**n)]))
-        results.append(np.sum(abs(np.linalg.eigvals(extrapolation_study(circ, p)))))
+        results.append(_extrapolation_support(n, D, p, [randsite, (randsite+1)%(2**n)], scales))
+        if stats is not None:
+            stats.add(results[-1])
+            if verbose:
+                print(stats.snapshot())
     return results
 
 
-def noise_estimate_pcc_naive(n, D, p, samples, verbose=False):
+def _naive_support(n, D, p, supp):
+    circ = cached_compress(pcc_dmera_1d(n, D, supp))
+    n_e = 0
+    for c in circ:
+        for g in c:
+            n_e += len(g)
+    return n_e * p
+
+
+def _naive_sample(n, D, p, seed):
+    return _naive_support(n, D, p, _random_support(n, np.random.default_rng(seed)))
+
+
+def noise_estimate_pcc_naive(n, D, p, samples, verbose=False, workers=1, seed=None, stats=None, store=None, shard=None):
+    if workers != 1 or seed is not None or store is not None:
+        metric = "noise_estimate_pcc_naive_1d"
+        return run_samples(_naive_sample, (n, D, p), samples, seed, workers,
+                           initializer=dmera_1d_circuit, initargs=(n, D), verbose=verbose, stats=stats, store=store, shard=shard,
+                           key=lambda s: make_key(metric, n, D, p, seed=s))
     results = []
     for i in range(samples):
         if verbose:
@@ -38,10 +151,9 @@ def noise_estimate_pcc_naive(n, D, p, samples, verbose=False):
         randsite = np.random.randint(2**n)
         if verbose:
             print("randsite = {}".format(randsite))
-        circ = compress(pcc_dmera_1d(n, D, [randsite, (randsite+1)%(2**n)]))
-        n_e = 0
-        for c in circ:
-            for g in c:
-                n_e += len(g)
-        results.append(n_e * p)
+        results.append(_naive_support(n, D, p, [randsite, (randsite+1)%(2**n)]))
+        if stats is not None:
+            stats.add(results[-1])
+            if verbose:
+                print(stats.snapshot())
     return results
@@ -1,90 +1,68 @@
-from sim import noise_study, extrapolation_study
-from D2_v2 import pcc_dmera_2d, convert_2d_to_1d
-from compressor import compress, qubits
-import numpy as np
+from sim import noise_study, extrapolation_study, trace_norm
+from D2_v2 import pcc_dmera_2d, convert_2d_to_1d, dmera_2d_circuit
+from circuit_cache import cached_compress
+from sweep import sweep
+from stats import StatsTable
+from checkpoint import make_key
 
 
-def noise_estimate_pcc(n, D, p, verbose=False):
-    results = []
+def supports_2d(n):
+    """
+    Both nearest-neighbor supports (along x, then along y) of every site.
+
+    Args:
+        n(int): Number of scales
+
+    Returns:
+        list(list(int)): Supports, in 1D coordinates
+    """
+    supps = []
     for x in range(2**n):
         for y in range(2**n):
-            if verbose:
-                print("{},{}".format(x, y))
-        
             supp_x = [(x, y), ((x+1)%(2**n), y)]
             supp_y = [(x, y), (x, (y+1)%(2**n))]
-            
-            supp_x_con = [convert_2d_to_1d(c,n) for c in supp_x]
-            supp_y_con = [convert_2d_to_1d(c,n) for c in supp_y]
-        
-            circ = compress(pcc_dmera_2d(n, D, supp_x_con))
-            results.append(np.sum(abs(np.linalg.eigvals(noise_study(circ, p)))))
-            n_q = len(qubits(circ))
-
-            circ = compress(pcc_dmera_2d(n, D, supp_y_con))
-            results.append(np.sum(abs(np.linalg.eigvals(noise_study(circ, p)))))
-            n_q = len(qubits(circ))
-        
-            if verbose:
-                print("Number of qubits={}".format(n_q))
 
-    return results
+            supps.append([convert_2d_to_1d(c,n) for c in supp_x])
+            supps.append([convert_2d_to_1d(c,n) for c in supp_y])
+    return supps
 
 
-def extrapolation_estimate_pcc(n, D, p, verbose=False):
-    results = []
-    for x in range(2**n):
-        for y in range(2**n):
-            if verbose:
-                print("{},{}".format(x, y))
+def _noise_pcc(n, D, p, supp):
+    circ = cached_compress(pcc_dmera_2d(n, D, supp))
+    return trace_norm(noise_study(circ, p))
 
-        
-            supp_x = [(x, y), ((x+1)%(2**n), y)]
-            supp_y = [(x, y), (x, (y+1)%(2**n))]
-            
-            supp_x_con = [convert_2d_to_1d(c,n) for c in supp_x]
-            supp_y_con = [convert_2d_to_1d(c,n) for c in supp_y]
-        
-            circ = compress(pcc_dmera_2d(n, D, supp_x_con))
-            results.append(np.sum(abs(np.linalg.eigvals(extrapolation_study(circ, p)))))
-            n_q = len(qubits(circ))
-
-            circ = compress(pcc_dmera_2d(n, D, supp_y_con))
-            results.append(np.sum(abs(np.linalg.eigvals(extrapolation_study(circ, p)))))
-            n_q = len(qubits(circ))
-        
-            if verbose:
-                print("Number of qubits={}".format(n_q))
-    return results
 
+def _extrapolation_pcc(n, D, p, supp):
+    circ = cached_compress(pcc_dmera_2d(n, D, supp))
+    return trace_norm(extrapolation_study(circ, p))
 
-def noise_estimate_pcc_naive(n, D, p, verbose=False):
-    results = []
-    
-    for x in range(2**n):
-        for y in range(2**n):
-            if verbose:
-                print("{},{}".format(x, y))
 
-        
-            supp_x = [(x, y), ((x+1)%(2**n), y)]
-            supp_y = [(x, y), (x, (y+1)%(2**n))]
-            
-            supp_x_con = [convert_2d_to_1d(c,n) for c in supp_x]
-            supp_y_con = [convert_2d_to_1d(c,n) for c in supp_y]
-
-            circ = compress(pcc_dmera_2d(n, D, supp_x_con))
-            n_e = 0
-            for c in circ:
-                for g in c:
-                    n_e += len(g)
-            results.append(n_e * p)
-            
-            circ = compress(pcc_dmera_2d(n, D, supp_y_con))
-            n_e = 0
-            for c in circ:
-                for g in c:
-                    n_e += len(g)
-            results.append(n_e * p)
+def _naive_pcc(n, D, p, supp):
+    circ = cached_compress(pcc_dmera_2d(n, D, supp))
+    n_e = 0
+    for c in circ:
+        for g in c:
+            n_e += len(g)
+    return n_e * p
+
 
+def _sweep_supports(func, n, D, p, verbose, workers, stats, store, shard):
+    args = [(n, D, p, supp) for supp in supports_2d(n)]
+    table = None if stats is None else StatsTable({'value': stats})
+    metric = func.__name__.lstrip('_') + '_2d_brute'
+    results, _ = sweep(func, args, workers=workers, initializer=dmera_2d_circuit,
+                       initargs=(n, D), verbose=verbose, stats=table, store=store, shard=shard,
+                       key=lambda a: make_key(metric, n, D, p, support=a[3]))
     return results
+
+
+def noise_estimate_pcc(n, D, p, verbose=False, workers=1, stats=None, store=None, shard=None):
+    return _sweep_supports(_noise_pcc, n, D, p, verbose, workers, stats, store, shard)
+
+
+def extrapolation_estimate_pcc(n, D, p, verbose=False, workers=1, stats=None, store=None, shard=None):
+    return _sweep_supports(_extrapolation_pcc, n, D, p, verbose, workers, stats, store, shard)
+
+
+def noise_estimate_pcc_naive(n, D, p, verbose=False, workers=1, stats=None, store=None, shard=None):
+    return _sweep_supports(_naive_pcc, n, D, p, verbose, workers, stats, store, shard)
@@ -1,30 +1,38 @@
-from D1_v2 import width_pcc_dmera_1d, depth_pcc_dmera_1d
-import numpy as np
+from D1_v2 import stats_pcc_dmera_1d, dmera_1d_circuit
+from sweep import sweep
+from checkpoint import ResultStore, make_key
 
 
 n=8
 D=10
-widths = []
-depths = []
-vols = []
+# Processes used to scan the supports (None: all cores)
+workers = None
+# Checkpoint file (None: no checkpointing). Completed supports are skipped
+# when the script is rerun. shard=(index, count) runs one part of the scan,
+# see checkpoint.merge_stores.
+checkpoint = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
+args = []
 
 for x in range(2**n):
-    print("x={}/{}".format(x+1, 2**n))
     supp = [x, (x+1)%(2**n)]
-    width = width_pcc_dmera_1d(n,D, supp)
-    depth = depth_pcc_dmera_1d(n,D, supp)
-    widths.append(width)
-    depths.append(depth)
-    vols.append(width*depth)
+    args.append((n,D, supp))
 
-print("max width={}".format(max(widths)))
-print("average width={}".format(np.mean(widths)))
-print("Standard deviation={}".format(np.std(widths)))
+_, summary = sweep(stats_pcc_dmera_1d, args, workers=workers,
+                   initializer=dmera_1d_circuit, initargs=(n,D), verbose=True,
+                   keep_results=False,
+                   store=store, shard=shard,
+                   key=lambda a: make_key('stats_pcc_dmera_1d', n, D, support=a[2]))
 
-print("max depth={}".format(max(depths)))
-print("average depth={}".format(np.mean(depths)))
-print("Standard deviation={}".format(np.std(depths)))
+print("max width={}".format(summary['width']['max']))
+print("average width={}".format(summary['width']['mean']))
+print("Standard deviation={}".format(summary['width']['std']))
 
-print("max vol={}".format(max(vols)))
-print("average vol={}".format(np.mean(vols)))
-print("Standard deviation={}".format(np.std(vols)))
+print("max depth={}".format(summary['depth']['max']))
+print("average depth={}".format(summary['depth']['mean']))
+print("Standard deviation={}".format(summary['depth']['std']))
+
+print("max vol={}".format(summary['volume']['max']))
+print("average vol={}".format(summary['volume']['mean']))
+print("Standard deviation={}".format(summary['volume']['std']))
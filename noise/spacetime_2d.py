@@ -1,43 +1,47 @@
-from D2_v2 import width_pcc_dmera_2d, depth_pcc_dmera_2d
-import numpy as np
+from D2_v2 import stats_pcc_dmera_2d, dmera_2d_circuit
+from sweep import sweep
+from checkpoint import ResultStore, make_key
+from stats import StatsTable
 
 
 n=5
 D=10
-widths = []
-depths = []
-vols = []
+# Processes used to scan the supports (None: all cores)
+workers = None
+# Checkpoint file (None: no checkpointing). Completed supports are skipped
+# when the script is rerun. shard=(index, count) runs one part of the scan,
+# see checkpoint.merge_stores.
+checkpoint = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
+args = []
 
 
 for x in range(2**n):
     for y in range(2**n):
-        print("x={}/{}, y={}/{}".format(x+1, 2**n, y+1, 2**n))
         supp_x = [(x,y), ((x+1)%(2**n),y)]
         supp_y = [(x,y), (x,(y+1)%(2**n))]
-
-        width = width_pcc_dmera_2d(n,D, supp_x)
-        depth = depth_pcc_dmera_2d(n,D, supp_x)
-        widths.append(width)
-        depths.append(depth)
-        vols.append(width*depth)
-
-        width = width_pcc_dmera_2d(n,D, supp_y)
-        depth = depth_pcc_dmera_2d(n,D, supp_y)
-        widths.append(width)
-        depths.append(depth)
-        vols.append(width*depth)
-
-for w in widths:
-    print(w)
-        
-print("max width={}".format(max(widths)))
-print("average width={}".format(np.mean(widths)))
-print("Standard deviation={}".format(np.std(widths)))
-
-print("max depth={}".format(max(depths)))
-print("average depth={}".format(np.mean(depths)))
-print("Standard deviation={}".format(np.std(depths)))
-
-print("max vol={}".format(max(vols)))
-print("average vol={}".format(np.mean(vols)))
-print("Standard deviation={}".format(np.std(vols)))
+        args.append((n,D, supp_x))
+        args.append((n,D, supp_y))
+
+stats = StatsTable()
+_, summary = sweep(stats_pcc_dmera_2d, args, workers=workers,
+                   initializer=dmera_2d_circuit, initargs=(n,D), verbose=True,
+                   stats=stats, keep_results=False,
+                   store=store, shard=shard,
+                   key=lambda a: make_key('stats_pcc_dmera_2d', n, D, support=a[2]))
+
+for w, count in stats['width'].histogram():
+    print("width={}: {} supports".format(w, count))
+
+print("max width={}".format(summary['width']['max']))
+print("average width={}".format(summary['width']['mean']))
+print("Standard deviation={}".format(summary['width']['std']))
+
+print("max depth={}".format(summary['depth']['max']))
+print("average depth={}".format(summary['depth']['mean']))
+print("Standard deviation={}".format(summary['depth']['std']))
+
+print("max vol={}".format(summary['volume']['max']))
+print("average vol={}".format(summary['volume']['mean']))
+print("Standard deviation={}".format(summary['volume']['std']))
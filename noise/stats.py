@@ -0,0 +1,192 @@
+###################################
+# Streaming statistics            #
+###################################
+import numpy as np
+import math
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min and max of a stream of numbers, updated one
+    value at a time (Welford's algorithm), plus an optional histogram and
+    reservoir-sampled quantiles. Memory does not grow with the number of
+    values (except for the number of distinct histogram bins).
+
+    Args:
+        bin_width(float): Histogram bin width. None keeps one bin per
+                          distinct integer value, which suits integer
+                          metrics such as width and depth, and does not
+                          bin other values (e.g. trace norms). 0 disables
+                          the histogram.
+        reservoir(int): Number of values kept for quantile estimates. The
+                        quantiles are exact until this many values were
+                        added. 0 disables quantiles.
+        seed(int): Seed of the reservoir sampler
+    """
+    def __init__(self, bin_width=None, reservoir=0, seed=None):
+        self.bin_width = bin_width
+        self.reservoir = reservoir
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._bins = {}
+        self._sample = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, x):
+        """
+        Args:
+            x(float): New value
+        """
+        self.count += 1
+        self.total += x
+        d = x - self._mean
+        self._mean += d / self.count
+        self._m2 += d * (x - self._mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        if self.bin_width is None:
+            if isinstance(x, (int, np.integer)):
+                self._bins[int(x)] = self._bins.get(int(x), 0) + 1
+        elif self.bin_width != 0:
+            b = math.floor(x / self.bin_width) * self.bin_width
+            self._bins[b] = self._bins.get(b, 0) + 1
+        if self.reservoir:
+            if len(self._sample) < self.reservoir:
+                self._sample.append(x)
+            else:
+                k = self._rng.integers(self.count)
+                if k < self.reservoir:
+                    self._sample[k] = x
+
+    def update(self, xs):
+        """
+        Args:
+            xs(iterable): New values
+        """
+        for x in xs:
+            self.add(x)
+
+    def merge(self, other):
+        """
+        Fold the values seen by other into self (e.g. the statistics of two
+        workers). The reservoir of the result is a uniform sample only if
+        neither reservoir overflowed.
+
+        Args:
+            other(RunningStats): Statistics of other values
+        """
+        if other.count == 0:
+            return
+        n = self.count + other.count
+        d = other._mean - self._mean
+        self._m2 += other._m2 + d * d * self.count * other.count / n
+        self._mean += d * other.count / n
+        self.count = n
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        for b, c in other._bins.items():
+            self._bins[b] = self._bins.get(b, 0) + c
+        if self.reservoir:
+            self._sample = (self._sample + other._sample)[:self.reservoir]
+
+    @property
+    def mean(self):
+        # sum/count rather than the Welford mean, so that integer data gives
+        # exactly np.mean
+        return self.total / self.count if self.count else float('nan')
+
+    @property
+    def var(self):
+        """Population variance, as np.var."""
+        return self._m2 / self.count if self.count else float('nan')
+
+    @property
+    def std(self):
+        """Population standard deviation, as np.std."""
+        return math.sqrt(self.var) if self.count else float('nan')
+
+    @property
+    def sem(self):
+        """Standard error of the mean (sample standard deviation/sqrt(count))."""
+        if self.count < 2:
+            return float('inf')
+        return math.sqrt(self._m2 / (self.count - 1) / self.count)
+
+    def histogram(self):
+        """
+        Returns:
+            list(tuple): (bin, count) in increasing order of bin. A bin is
+                         labelled by its lower edge.
+        """
+        return sorted(self._bins.items())
+
+    def quantile(self, q):
+        """
+        Args:
+            q(float or list): Quantile(s) in [0, 1]
+
+        Returns:
+            float or np.ndarray: Quantile estimate(s) from the reservoir
+        """
+        if not self._sample:
+            raise ValueError("quantile needs reservoir > 0 and at least one value")
+        return np.quantile(self._sample, q)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: count, mean, std, sem, min and max
+        """
+        return {'count': self.count, 'mean': self.mean, 'std': self.std, 'sem': self.sem,
+                'min': self.min, 'max': self.max}
+
+    def __repr__(self):
+        return "RunningStats(count={}, mean={}, std={}, min={}, max={})".format(
+            self.count, self.mean, self.std, self.min, self.max)
+
+
+class StatsTable:
+    """
+    One RunningStats per numeric field of a stream of results. A result is
+    either a dict (e.g. the output of stats_pcc_dmera_*) or a number, which
+    is recorded under 'value'.
+
+    Args:
+        fields(dict): Initial {field: RunningStats}
+        **kwargs: Arguments of the RunningStats created for new fields
+    """
+    def __init__(self, fields=None, **kwargs):
+        self.fields = dict(fields) if fields else {}
+        self.kwargs = kwargs
+
+    def add(self, result):
+        """
+        Args:
+            result(dict or float): New result
+        """
+        if not isinstance(result, dict):
+            result = {'value': result}
+        for key, x in result.items():
+            if isinstance(x, bool) or not isinstance(x, (int, float, np.number)):
+                continue
+            if key not in self.fields:
+                self.fields[key] = RunningStats(**self.kwargs)
+            self.fields[key].add(x)
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {field: RunningStats.snapshot()}
+        """
+        return {key: s.snapshot() for key, s in self.fields.items()}
@@ -3,7 +3,8 @@
 # Isaac H. Kim 2020/12/24         #
 ###################################
 import numpy as np
-from compressor import pcc, qubits, circ_subtract, rearrange, compress, optimal_width_freeze, depth_width_reduced_freeze
+from functools import lru_cache
+from compressor import Circuit, pcc, gates_per_layer_batch, qubits, circ_subtract, rearrange, compress, optimal_width_freeze, depth_width_reduced_freeze, compress_freeze_stats
 
 
 def sites_1d(n, s):
@@ -66,6 +67,21 @@ def dmera_1d(n, D):
     return circ
 
 
+@lru_cache(maxsize=None)
+def dmera_1d_circuit(n, D):
+    """
+    dmera_1d(n, D) as a read-only Circuit. Built once per (n, D) and
+    shared by pcc_dmera_1d and everything built on it.
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+
+    Returns:
+        Circuit: Array-backed DMERA circuit
+    """
+    return Circuit.from_list(dmera_1d(n, D))
+
+
 def pcc_dmera_1d(n, D, supp):
     """
     Args:
@@ -76,7 +92,7 @@ def pcc_dmera_1d(n, D, supp):
     Returns:
         list(list(tuple)): Past causal cone of supp
     """
-    return pcc(dmera_1d(n,D), supp)
+    return pcc(dmera_1d_circuit(n,D), supp).to_list()
 
 
 def width_pcc_dmera_1d_nocompression(n, D, supp):
@@ -90,13 +106,29 @@ def width_pcc_dmera_1d_nocompression(n, D, supp):
     Returns:
         int: Optimal width
     """
-    c = pcc(dmera_1d(n,D), supp)
+    c = pcc_dmera_1d(n,D,supp)
     width_max = 0
     for s in c:
         mywidth = np.sum([len(g) for g in s])
         if mywidth > width_max:
             width_max = mywidth
     return width_max
+
+
+def width_pcc_dmera_1d_nocompression_batch(n, D, supps):
+    """
+    Uncompressed width of the pcc of many supports, from one vectorized
+    sweep over the circuit.
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        supps(list(list)): List of supports
+
+    Returns:
+        list(int): Uncompressed width of each support
+    """
+    counts = gates_per_layer_batch(dmera_1d_circuit(n,D), supps)
+    return (2 * counts.max(axis=1, initial=0)).tolist()
     
 
 def width_pcc_dmera_1d(n, D, supp):
@@ -125,3 +157,19 @@ def depth_pcc_dmera_1d(n, D, supp):
         int: Optimal width
     """
     return depth_width_reduced_freeze(pcc_dmera_1d(n,D,supp), supp)
+
+
+def stats_pcc_dmera_1d(n, D, supp, keep_circuit=False):
+    """
+    Width, depth, volume and number of resets of the width-reduced past
+    causal cone, from a single compression
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        supp(list): List of integers
+        keep_circuit(bool): Also return the compressed circuit
+
+    Returns:
+        dict: See compressor.compressed_stats
+    """
+    return compress_freeze_stats(pcc_dmera_1d(n,D,supp), supp, keep_circuit)
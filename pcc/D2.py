@@ -3,7 +3,8 @@
 # Isaac H. Kim 2020/12/24         #
 ###################################
 import numpy as np
-from compressor import pcc, qubits, circ_subtract, rearrange, compress, optimal_width_freeze, depth_width_reduced_freeze
+from functools import lru_cache
+from compressor import Circuit, pcc, gates_per_layer_batch, qubits, circ_subtract, rearrange, compress, optimal_width_freeze, depth_width_reduced_freeze, compress_freeze_stats
 
 
 def sites_2d(n, s):
@@ -138,6 +139,21 @@ def dmera_2d(n, D):
     return dmera_out
 
 
+@lru_cache(maxsize=None)
+def dmera_2d_circuit(n, D):
+    """
+    dmera_2d(n, D) as a read-only Circuit. Built once per (n, D) and
+    shared by pcc_dmera_2d and everything built on it.
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+
+    Returns:
+        Circuit: Array-backed DMERA circuit
+    """
+    return Circuit.from_list(dmera_2d(n, D))
+
+
 def pcc_dmera_2d(n, D, supp):
     """
     Args:
@@ -148,7 +164,7 @@ def pcc_dmera_2d(n, D, supp):
     Returns:
         list(list(tuple)): Past causal cone of supp
     """
-    return pcc(dmera_2d(n,D),supp)
+    return pcc(dmera_2d_circuit(n,D), supp).to_list()
 
 
 def width_pcc_dmera_2d(n, D, supp):
@@ -200,3 +216,37 @@ def depth_pcc_dmera_2d(n, D, supp):
     """
     supp_con = [convert_2d_to_1d(c,n) for c in supp]
     return depth_width_reduced_freeze(pcc_dmera_2d(n,D,supp_con),supp_con)
+
+
+def stats_pcc_dmera_2d(n, D, supp, keep_circuit=False):
+    """
+    Width, depth, volume and number of resets of the width-reduced past
+    causal cone, from a single compression
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        supp(list): List of 2D coordinates
+        keep_circuit(bool): Also return the compressed circuit
+
+    Returns:
+        dict: See compressor.compressed_stats
+    """
+    supp_con = [convert_2d_to_1d(c,n) for c in supp]
+    return compress_freeze_stats(pcc_dmera_2d(n,D,supp_con), supp_con, keep_circuit)
+
+
+def width_pcc_dmera_2d_nocompression_batch(n, D, supps):
+    """
+    Uncompressed width of the pcc of many supports, from one vectorized
+    sweep over the circuit.
+    Args:
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        supps(list(list)): List of supports, each a list of 2D coordinates
+
+    Returns:
+        list(int): Uncompressed width of each support
+    """
+    supps_con = [[convert_2d_to_1d(c,n) for c in supp] for supp in supps]
+    counts = gates_per_layer_batch(dmera_2d_circuit(n,D), supps_con)
+    return (2 * counts.max(axis=1, initial=0)).tolist()
@@ -0,0 +1,170 @@
+###################################
+# Checkpoint store for sweeps     #
+###################################
+import numpy as np
+import sqlite3
+import json
+import sys
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    metric  TEXT NOT NULL,
+    n       INTEGER NOT NULL,
+    D       INTEGER NOT NULL,
+    p       TEXT NOT NULL,
+    support TEXT NOT NULL,
+    seed    TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    PRIMARY KEY (metric, n, D, p, support, seed)
+)
+"""
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    raise TypeError("Cannot store {!r}".format(o))
+
+
+def seed_label(seed):
+    """
+    Args:
+        seed(numpy.random.SeedSequence): Seed of one sample
+
+    Returns:
+        str: Label identifying the seed (root entropy and spawn key)
+    """
+    return "{}:{}".format(seed.entropy, "/".join(str(k) for k in seed.spawn_key))
+
+
+def make_key(metric, n, D, p=None, support=None, seed=None):
+    """
+    Normalized store key. p is kept exactly (repr of the float), support
+    as JSON, and missing fields as ''.
+
+    Args:
+        metric(str): What was computed, including any option that changes
+                     the result (e.g. the backend)
+        n(int): Number of scales
+        D(int): Number of cycles per scale
+        p(float): Noise rate
+        support(list): Support, if the result is for a fixed support
+        seed(str or numpy.random.SeedSequence): Seed, if the result is random
+
+    Returns:
+        tuple: (metric, n, D, p, support, seed)
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        seed = seed_label(seed)
+    return (str(metric), int(n), int(D),
+            '' if p is None else repr(float(p)),
+            '' if support is None else json.dumps(support, default=_json_default),
+            '' if seed is None else str(seed))
+
+
+class ResultStore:
+    """
+    Append-only SQLite store of sweep results keyed by
+    (metric, n, D, p, support, seed). A key is written at most once, so a
+    sweep that is restarted with the same store skips everything that was
+    already computed. Values are stored as JSON (numbers, or dicts such as
+    the output of stats_pcc_dmera_*).
+
+    Args:
+        path(str): SQLite file, created if needed
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(_SCHEMA)
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """
+        Args:
+            keys(list(tuple)): Keys from make_key
+
+        Returns:
+            dict: {key: value} for the keys that are in the store
+        """
+        found = {}
+        for key in keys:
+            row = self.conn.execute(
+                "SELECT value FROM results WHERE metric=? AND n=? AND D=? AND p=? AND support=? AND seed=?",
+                key).fetchone()
+            if row is not None:
+                found[key] = json.loads(row[0])
+        return found
+
+    def put_many(self, items):
+        """
+        Append results and commit. Keys that are already stored are left
+        untouched.
+
+        Args:
+            items(list(tuple)): (key, value) pairs
+        """
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [key + (json.dumps(value, default=_json_default),) for key, value in items])
+        self.conn.commit()
+
+    def values(self, metric, n, D, p=None):
+        """
+        Args:
+            metric(str): Metric
+            n(int): Number of scales
+            D(int): Number of cycles per scale
+            p(float): Noise rate
+
+        Returns:
+            list: All stored values of (metric, n, D, p)
+        """
+        rows = self.conn.execute(
+            "SELECT value FROM results WHERE metric=? AND n=? AND D=? AND p=? ORDER BY support, seed",
+            make_key(metric, n, D, p)[:4]).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_stores(dest, sources):
+    """
+    Merge the results of several stores (e.g. the shards of one sweep run
+    on different machines) into dest.
+
+    Args:
+        dest(str): Destination file, created if needed
+        sources(list(str)): Store files to merge
+
+    Returns:
+        int: Number of results in dest
+    """
+    with ResultStore(dest) as store:
+        for src in sources:
+            store.conn.execute("ATTACH DATABASE ? AS src", (src,))
+            store.conn.execute("INSERT OR IGNORE INTO results SELECT * FROM src.results")
+            store.conn.commit()
+            store.conn.execute("DETACH DATABASE src")
+        return len(store)
+
+
+if __name__ == '__main__':
+    # python checkpoint.py merge DEST SOURCE [SOURCE ...]
+    if len(sys.argv) < 4 or sys.argv[1] != 'merge':
+        print("usage: python checkpoint.py merge DEST SOURCE [SOURCE ...]")
+        sys.exit(1)
+    print("{} results in {}".format(merge_stores(sys.argv[2], sys.argv[3:]), sys.argv[2]))
@@ -0,0 +1,167 @@
+###################################
+# Opt-in profiling                #
+###################################
+# Timers and counters for the hot paths of compressor and sim. Disabled by
+# default: a profiled function then costs one extra call and one flag check.
+#
+#   import profiling
+#   with profiling.session():
+#       sweep(stats_pcc_dmera_1d, args)
+#   print(profiling.report())
+#
+# Setting ER_NOISE_PROFILE=1 enables profiling at import. sweep.sweep
+# collects the records of its worker processes, so the report covers the
+# whole sweep.
+from contextlib import contextmanager
+import functools
+import time
+import os
+
+
+PROFILE_ENV = 'ER_NOISE_PROFILE'
+
+_enabled = os.environ.get(PROFILE_ENV, '') not in ('', '0')
+# name: [calls, total seconds, max seconds]; counters have zero times
+_records = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Discard all records.
+    """
+    _records.clear()
+
+
+def _add(name, calls, seconds, longest):
+    rec = _records.get(name)
+    if rec is None:
+        _records[name] = [calls, seconds, longest]
+    else:
+        rec[0] += calls
+        rec[1] += seconds
+        rec[2] = max(rec[2], longest)
+
+
+def count(name, k=1):
+    """
+    Increment the counter name by k (no-op when disabled).
+    """
+    if _enabled:
+        _add(name, k, 0.0, 0.0)
+
+
+@contextmanager
+def timer(name):
+    """
+    Time the enclosed block as one call of name (no-op when disabled).
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t = time.perf_counter() - start
+        _add(name, 1, t, t)
+
+
+def profiled(name=None):
+    """
+    Decorator timing every call of the function while profiling is enabled.
+
+    Args:
+        name(str): Record name. Defaults to the function's name.
+    """
+    def decorate(func):
+        label = func.__name__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                t = time.perf_counter() - start
+                _add(label, 1, t, t)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """
+    Returns:
+        dict: {name: (calls, total seconds, max seconds)}
+    """
+    return {name: tuple(rec) for name, rec in _records.items()}
+
+
+def pop():
+    """
+    Returns:
+        dict: snapshot(), after which the records are discarded
+    """
+    snap = snapshot()
+    reset()
+    return snap
+
+
+def merge(snap):
+    """
+    Add the records of a snapshot, e.g. one taken in a worker process.
+    """
+    for name, (calls, seconds, longest) in snap.items():
+        _add(name, calls, seconds, longest)
+
+
+@contextmanager
+def session():
+    """
+    Enable profiling with empty records for the enclosed block. The records
+    are kept afterwards (see report), and the previous state is restored.
+    """
+    global _enabled
+    previous = _enabled
+    reset()
+    _enabled = True
+    try:
+        yield
+    finally:
+        _enabled = previous
+
+
+def report(snap=None):
+    """
+    Args:
+        snap(dict): Records to format. Defaults to the current records.
+
+    Returns:
+        str: One line per record, by decreasing total time. Times of nested
+             records (e.g. twoQ inside a profiled block) are inclusive.
+    """
+    if snap is None:
+        snap = snapshot()
+    lines = ["{:24s} {:>10s} {:>12s} {:>12s} {:>12s}".format('name', 'calls', 'total(s)', 'mean(s)', 'max(s)')]
+    for name, (calls, seconds, longest) in sorted(snap.items(), key=lambda kv: (-kv[1][1], kv[0])):
+        if seconds == 0:
+            lines.append("{:24s} {:>10d}".format(name, calls))
+        else:
+            lines.append("{:24s} {:>10d} {:>12.4g} {:>12.4g} {:>12.4g}".format(
+                name, calls, seconds, seconds/calls, longest))
+    return "\n".join(lines)
@@ -1,50 +1,55 @@
-from D2 import width_pcc_dmera_2d, depth_pcc_dmera_2d, width_pcc_dmera_2d_nocompression
+from D2 import stats_pcc_dmera_2d, dmera_2d_circuit, width_pcc_dmera_2d_nocompression_batch
+from sweep import sweep
+from checkpoint import ResultStore, make_key
 import numpy as np
 
 
 n=5
 D=10
-widths = []
-widths_nc = []
-depths = []
-vols = []
+# Also compress every cone (width, depth and volume). This runs
+# compress_freeze for all 2*4^n supports, which is slow at n=5, D=10.
+compressed = False
+# Processes used to compress the cones (None: all cores)
+workers = None
+# Checkpoint file of the compressed statistics (None: no checkpointing).
+# Completed supports are skipped
+# when the script is rerun. shard=(index, count) runs one part of the scan,
+# see checkpoint.merge_stores.
+checkpoint = None
+shard = None
+store = None if checkpoint is None else ResultStore(checkpoint)
+supps = []
 
 
 for x in range(2**n):
     for y in range(2**n):
-        print("x={}/{}, y={}/{}".format(x+1, 2**n, y+1, 2**n))
         supp_x = [(x,y), ((x+1)%(2**n),y)]
         supp_y = [(x,y), (x,(y+1)%(2**n))]
+        supps.append(supp_x)
+        supps.append(supp_y)
 
-#        width = width_pcc_dmera_2d(n,D, supp_x)
-        width_nc = width_pcc_dmera_2d_nocompression(n, D, supp_x)
-#        depth = depth_pcc_dmera_2d(n,D, supp_x)
-#        widths.append(width)
-        widths_nc.append(width_nc)
-#        depths.append(depth)
-#        vols.append(width*depth)
-
-#        width = width_pcc_dmera_2d(n,D, supp_y)
-        width_nc = width_pcc_dmera_2d_nocompression(n, D, supp_y)
-#        depth = depth_pcc_dmera_2d(n,D, supp_y)
-#        widths.append(width)
-        widths_nc.append(width_nc)
-#        depths.append(depth)
-#        vols.append(width*depth)
-
+widths_nc = width_pcc_dmera_2d_nocompression_batch(n, D, supps)
 
 print("max width (uncompressed)={}".format(max(widths_nc)))
 print("average width (uncompresed)={}".format(np.mean(widths_nc)))
-print("Standard deviation={}".format(np.std(widths)))
-        
-print("max width={}".format(max(widths)))
-print("average width={}".format(np.mean(widths)))
-print("Standard deviation={}".format(np.std(widths)))
-
-print("max depth={}".format(max(depths)))
-print("average depth={}".format(np.mean(depths)))
-print("Standard deviation={}".format(np.std(depths)))
-
-print("max vol={}".format(max(vols)))
-print("average vol={}".format(np.mean(vols)))
-print("Standard deviation={}".format(np.std(vols)))
+print("Standard deviation={}".format(np.std(widths_nc)))
+
+if compressed:
+    args = [(n,D, supp) for supp in supps]
+    _, summary = sweep(stats_pcc_dmera_2d, args, workers=workers,
+                       initializer=dmera_2d_circuit, initargs=(n,D), verbose=True,
+                       keep_results=False,
+                       store=store, shard=shard,
+                       key=lambda a: make_key('stats_pcc_dmera_2d', n, D, support=a[2]))
+
+    print("max width={}".format(summary['width']['max']))
+    print("average width={}".format(summary['width']['mean']))
+    print("Standard deviation={}".format(summary['width']['std']))
+
+    print("max depth={}".format(summary['depth']['max']))
+    print("average depth={}".format(summary['depth']['mean']))
+    print("Standard deviation={}".format(summary['depth']['std']))
+
+    print("max vol={}".format(summary['volume']['max']))
+    print("average vol={}".format(summary['volume']['mean']))
+    print("Standard deviation={}".format(summary['volume']['std']))
@@ -1,4 +1,4 @@
-from D2 import width_pcc_dmera_2d, depth_pcc_dmera_2d, width_pcc_dmera_2d_nocompression
+from D2 import width_pcc_dmera_2d, depth_pcc_dmera_2d, width_pcc_dmera_2d_nocompression_batch
 import numpy as np
 
 
@@ -8,12 +8,13 @@ ls= [l+2 for l in range(9)]
 widths_nc = []
 
 for l in ls:
+    supps = []
     for x in range(2**n):
         for y in range(2**n):
             #print("x={}/{}, y={}/{}".format(x+1, 2**n, y+1, 2**n))
             supp = [((xp+x)%(2**n),(yp+y)%(2**n)) for xp in range(l) for yp in range(l)]
-            width_nc = width_pcc_dmera_2d_nocompression(n, D, supp)
-            widths_nc.append(width_nc)
+            supps.append(supp)
+    widths_nc += width_pcc_dmera_2d_nocompression_batch(n, D, supps)
 
 
 
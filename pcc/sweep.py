@@ -0,0 +1,145 @@
+###################################
+# Parallel sweep runner           #
+###################################
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from stats import StatsTable
+import profiling
+import multiprocessing
+import numpy as np
+import os
+
+
+def _mp_context():
+    # The driver scripts have no __main__ guard, so fork where possible
+    # rather than re-importing them in every worker.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+
+def _init_worker(initializer, initargs):
+    # Forked workers inherit the parent's np.random state; reseed so that
+    # they do not all draw the same random numbers.
+    np.random.seed()
+    # Records inherited from the parent are already counted there
+    profiling.reset()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk(func, indices, chunk):
+    return indices, [func(*a) for a in chunk]
+
+
+def _run_chunk_profiled(func, indices, chunk):
+    # Profiling records of the chunk travel back with its results
+    indices, chunk_results = _run_chunk(func, indices, chunk)
+    return indices, chunk_results, profiling.pop() if profiling.enabled() else None
+
+
+def sweep(func, args, workers=None, chunksize=None, initializer=None, initargs=(), verbose=False, stats=None, keep_results=True,
+          store=None, key=None, shard=None):
+    """
+    Evaluate func(*a) for every a in args, distributed over a process pool.
+
+    Typical use is func=stats_pcc_dmera_2d with one (n, D, supp) per
+    support, and initializer=dmera_2d_circuit with initargs=(n, D), so that
+    every worker builds the DMERA circuit once and reuses it for all of
+    its supports.
+
+    While profiling is enabled (see profiling.session), the timers and
+    counters of the worker processes are added to those of this process.
+
+    Args:
+        func(callable): Module-level (picklable) function
+        args(list(tuple)): Arguments of each call
+        workers(int): Number of processes. Defaults to os.cpu_count().
+                      workers=1 runs everything in this process.
+        chunksize(int): Calls per task. Defaults to about four tasks per
+                        worker.
+        initializer(callable): Called once per worker as
+                               initializer(*initargs)
+        initargs(tuple): Arguments of initializer
+        verbose(bool): Print a snapshot of the statistics as chunks complete
+        stats(StatsTable): Statistics to feed with every result, e.g. to
+                           collect histograms. A new StatsTable if omitted.
+        keep_results(bool): If False, only the statistics are kept and
+                            None is returned in place of the results
+        store(checkpoint.ResultStore): Results already in the store are
+                                       not recomputed, and new results are
+                                       appended to it as chunks complete
+        key(callable): key(a) is the store key (checkpoint.make_key) of
+                       the call with arguments a. Required with store.
+        shard(tuple): (index, count): only evaluate the calls whose
+                      position in args is index modulo count. The other
+                      results are None and not in the statistics.
+
+    Returns:
+        list: func(*a) for each a, in the order of args
+        dict: Snapshot (count/mean/std/sem/min/max) of every numeric field
+              of the results, of the results themselves if they are
+              numbers (see StatsTable)
+    """
+    args = list(args)
+    if store is not None and key is None:
+        raise ValueError("store requires key")
+    results = [None] * len(args) if keep_results else None
+    if stats is None:
+        stats = StatsTable()
+
+    todo = list(range(len(args)))
+    if shard is not None:
+        todo = todo[shard[0]::shard[1]]
+    if store is not None:
+        keys = {i: key(args[i]) for i in todo}
+        stored = store.get_many(list(keys.values()))
+        for i in todo:
+            if keys[i] in stored:
+                if keep_results:
+                    results[i] = stored[keys[i]]
+                stats.add(stored[keys[i]])
+        todo = [i for i in todo if keys[i] not in stored]
+        if verbose and stored:
+            print("{} results loaded from {}".format(len(stored), store.path))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(todo)))
+    if chunksize is None:
+        chunksize = max(1, -(-len(todo) // (4*workers)))
+    chunks = []
+    for c in range(0, len(todo), chunksize):
+        indices = todo[c:c+chunksize]
+        chunks.append((indices, [args[i] for i in indices]))
+
+    done = 0
+
+    def collect(indices, chunk_results):
+        nonlocal done
+        for i, r in zip(indices, chunk_results):
+            if keep_results:
+                results[i] = r
+            stats.add(r)
+        if store is not None:
+            store.put_many([(keys[i], r) for i, r in zip(indices, chunk_results)])
+        done += len(chunk_results)
+        if verbose:
+            print("{}/{} done: {}".format(done, len(todo), stats.snapshot()))
+
+    if workers == 1:
+        if initializer is not None and todo:
+            initializer(*initargs)
+        for indices, chunk in chunks:
+            collect(*_run_chunk(func, indices, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(),
+                                 initializer=_init_worker,
+                                 initargs=(initializer, initargs)) as executor:
+            futures = [executor.submit(_run_chunk_profiled, func, indices, chunk) for indices, chunk in chunks]
+            for future in as_completed(futures):
+                indices, chunk_results, records = future.result()
+                if records:
+                    profiling.merge(records)
+                collect(indices, chunk_results)
+
+    return results, stats.snapshot()